@@ -1,35 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
-import threading
 from src.view.GUI import GUI
-from src.model.process_cluster_data import Model
-import multiprocessing as mp
+from src.model.engine_client import EngineClient, EngineError
+from src.model.lru_cache import LRUCache
 
-
-def listener(pipe, progress_callback):
-    while True:
-        message = pipe.recv()
-        if message == "DONE":
-            break
-        progress_callback(*message)
+# datasets kept by the controller, shown and prefetched
+DATASET_CACHE_ENTRIES = 64
+DATASET_CACHE_BYTES = 2**27
 
 
 class Controller:
     def __init__(self, app):
         self.view = GUI(app, self)
         self.app = app
+        # lists of states, exposures and proteins of the file shown
         self.model = None
-        self.thread = None
+        # id of the process request the engine is working on, whether it is
+        # being cancelled, and the proteins it has published so far
+        self.request = None
+        self.cancelling = False
+        self.ready = None
+        # started now so the workers are ready by the time a file is processed
+        self.engine = EngineClient()
+        self.engine.start()
+        # datasets of the file shown, with those next to the one shown
+        # fetched in the background so stepping through them does not wait
+        # for the engine
+        self.datasets = self.new_dataset_cache()
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.prefetch_generation = 0
+
+    def new_dataset_cache(self):
+        # replaced rather than cleared, so a prefetch still running for the
+        # datasets before stores into the old cache
+        return LRUCache(
+            max_entries=DATASET_CACHE_ENTRIES, max_bytes=DATASET_CACHE_BYTES
+        )
 
     # new model and process data from provided path
-    def check_thread(self):
-        if self.thread.is_alive():
-            self.view.app.after(100, self.check_thread)
-        else:
+    def check_engine(self):
+        while self.request is not None:
+            response = self.engine.poll(self.request)
+            if response is None:
+                self.view.app.after(100, self.check_engine)
+                return
+            status, value = response
+            if status == "partial":
+                if not self.cancelling:
+                    self.protein_published(*value)
+                continue
+            self.request = None
+            self.ready = None
             self.view.close_progress_window()
-            self.retrieve_data()
+            if status == "ok":
+                if self.model is None:
+                    self.model = value
+                    self.retrieve_data()
+                else:
+                    self.model = value
+                    self.view.update_lists(*value[:2])
+            elif status == "error":
+                self.view.processing_error(value)
+            if status != "ok" and self.model is not None:
+                # the proteins shown so far went with the run
+                self.remove_model()
+            # a file can be processed again
+
+    def protein_published(self, states, exposures, proteins, ready):
+        first = self.model is None
+        self.model = (states, exposures, proteins)
+        self.ready = set(ready)
+        # the no reference scale spans the proteins published so far
+        self.datasets = self.new_dataset_cache()
+        if first:
+            # every protein of the file is listed so one not published yet
+            # can be selected, which moves it to the front of the queue
+            self.view.new_model(states, exposures, proteins)
+            self.view.select_protein(ready[0])
+            self.view.create_plot_window(self.__get_data_from_model())
+            return
+        self.view.update_lists(states, exposures)
+        # proteins are listed in the order they were published
+        if self.view.get_selected_protein() == ready[-1]:
+            self.view.update_plot(self.__get_data_from_model())
+
+    def cancel_processing(self):
+        if self.request is not None and not self.cancelling:
+            self.cancelling = True
+            self.engine.cancel()
+            self.view.processing_cancelling()
 
     def retrieve_data(self):
-        states, exposures, proteins = self.model.get_states_protein_exposure_lists()
+        self.datasets = self.new_dataset_cache()
+        states, exposures, proteins = self.model
         self.view.new_model(states, exposures, proteins)
 
         data = self.__get_data_from_model()
@@ -42,74 +105,108 @@ class Controller:
         else:
             path = self.view.path_text.get()
         if os.path.exists(path) & os.path.isfile(path) & path.endswith(".csv"):
-            parent_conn, child_conn = mp.Pipe()
-            if sim_path:
-                self.model = Model(sim_path)
-            else:
-                self.model = Model(path)
-            listener_thread = threading.Thread(
-                target=listener, args=(parent_conn, self.update_progress)
-            )
-            listener_thread.start()
-            self.view.new_progress_window()
-            self.thread = threading.Thread(
-                target=self.model.start_process, args=(child_conn,)
-            )
-            self.thread.start()
-            self.check_thread()
+            if self.request is not None:
+                return
+            path = os.path.abspath(path)
+            # the engine process runs the file, or serves its cached results;
+            # progress events are read by the progress window from the Tk loop
+            self.request = self.engine.process(path)
+            self.cancelling = False
+            self.view.new_progress_window(self.engine.progress_queue)
+            self.check_engine()
 
         else:
             self.view.file_path_error()
             self.app.after(100, lambda: self.view.path_text.focus_set())
 
-    def update_progress(self, process, progress):
-        self.view.update_progress(process, progress)
-
     def __get_data_from_model(self):
-
+        protein = self.view.get_selected_protein()
+        exposure = self.view.get_selected_exposure()
         if self.view.reference_checkbox.get():
-            dataset = self.model.get_dataset(
-                self.view.get_selected_protein(),
-                self.view.get_selected_exposure(),
-                self.view.get_selected_state(),
-            )
-            self.view.set_chart_min_max(dataset["min_max"])
-            return dataset["data"]
+            state = self.view.get_selected_state()
+            # the other states are likely to be picked as reference next
+            neighbours = [
+                (protein, exposure, other)
+                for other in self.view.states
+                if other != state
+            ]
         else:
-            dataset = self.model.get_dataset(
-                self.view.get_selected_protein(),
-                self.view.get_selected_exposure(),
-            )
-            self.view.set_chart_min_max(dataset["min_max"])
-
-            return dataset["data"]
+            state = "no_ref"
+            neighbours = []
+        # and the exposures either side of this one
+        i = self.view.exposures.index(exposure)
+        neighbours = [
+            (protein, self.view.exposures[j], state)
+            for j in (i + 1, i - 1)
+            if 0 <= j < len(self.view.exposures)
+        ] + neighbours
+
+        dataset = self.datasets.get(
+            (protein, exposure, state),
+            lambda: self.engine.get_dataset(protein, exposure, state),
+        )
+        self.prefetch(neighbours)
+        self.view.set_chart_min_max(dataset["min_max"])
+        return dataset["data"]
+
+    def prefetch(self, keys):
+        self.prefetch_generation += 1
+        self.prefetcher.submit(
+            self.prefetch_datasets, self.datasets, keys, self.prefetch_generation
+        )
+
+    def prefetch_datasets(self, datasets, keys, generation):
+        # runs on the prefetch thread, so it must not touch the view
+        for key in keys:
+            if generation != self.prefetch_generation:
+                # the datasets next to a newer one are wanted instead
+                return
+            try:
+                datasets.get(key, lambda: self.engine.get_dataset(*key))
+            except EngineError:
+                # reported if the dataset is ever shown
+                pass
+
+    def __update_plot(self):
+        # a protein not published yet is plotted once it is
+        if self.ready is None or self.view.get_selected_protein() in self.ready:
+            self.view.update_plot(self.__get_data_from_model())
 
     def decrease_exposure(self):
         self.view.decrease_exposure()
-        data = data = self.__get_data_from_model()
-        self.view.update_plot(data)
+        self.__update_plot()
 
     def increase_exposure(self):
         self.view.increase_exposure()
-        data = self.__get_data_from_model()
-        self.view.update_plot(data)
+        self.__update_plot()
 
-    def change_protein(self, _):
-        data = self.__get_data_from_model()
-        self.view.update_plot(data)
+    def change_protein(self, protein):
+        if self.ready is not None and protein not in self.ready:
+            self.engine.prioritise(protein)
+        self.__update_plot()
 
     def change_ref_state(self, _):
-        data = self.__get_data_from_model()
-        self.view.update_plot(data)
+        self.__update_plot()
 
     def ref_checkbox_change(self):
-        data = self.__get_data_from_model()
-        self.view.update_plot(data)
+        self.__update_plot()
         if self.view.reference_checkbox.get():
             self.view.state_dropdown.configure(state="readonly")
         else:
             self.view.state_dropdown.configure(state="disabled")
 
+    def change_significance(self, _=None):
+        # markers only, the p-values do not depend on the threshold
+        p_threshold, fdr = self.view.read_significance()
+        self.view.update_significance(p_threshold, fdr)
+
     def remove_model(self):
+        self.cancel_processing()
         self.model = None
+        self.datasets = self.new_dataset_cache()
         self.view.model_removed()
+
+    def close(self):
+        self.prefetcher.shutdown(cancel_futures=True)
+        # cancels a run in progress
+        self.engine.shutdown()
@@ -11,3 +11,4 @@ if __name__ == "__main__":
     controller = Controller(app)
 
     app.mainloop()
+    controller.close()
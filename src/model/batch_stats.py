@@ -0,0 +1,118 @@
+from scipy.stats import f
+import numpy as np
+from src.model.studentized_range import get_studentized_range_table
+
+
+def batch_anova(mean, variance, count):
+    """One-way ANOVA between states for a whole batch of groups at once.
+
+    mean, variance and count are combined per-state statistics stacked as
+    [state, ...]; every trailing index (e.g. exposure x position) is an
+    independent group. States with a count of 0 are not part of a group.
+    Returns the F statistic, p-value and ms_within of each group.
+    ms_between and ms_within are 0 when their degrees of freedom are 0, F is
+    0 when ms_within is 0 and the p-value is NaN when either degrees of
+    freedom is 0.
+    """
+    present = count > 0
+    mean = np.where(present, mean, 0.0)
+    variance = np.where(present, variance, 0.0)
+
+    k = present.sum(axis=0)
+    n = count.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grand_mean = (mean * count).sum(axis=0) / n
+
+        ss_between = (count * (mean - grand_mean) ** 2).sum(axis=0)
+        df_between = k - 1
+        ms_between = np.where(df_between != 0, ss_between / df_between, 0.0)
+
+        ss_within = ((count - 1) * variance).sum(axis=0)
+        df_within = n - k
+        ms_within = np.where(df_within != 0, ss_within / df_within, 0.0)
+
+        f_stat = np.where(ms_within != 0, ms_between / ms_within, 0.0)
+
+    p_value = f.sf(f_stat, df_between, df_within)
+
+    return f_stat, p_value, ms_within
+
+
+def batch_tukey(
+    mean, count, ms_within, anova_p, p_threshold=0.05, studentized_range=None
+):
+    """Tukey HSD p-values between every pair of states for a batch of groups.
+
+    mean and count are stacked as [state, ...] like batch_anova, ms_within
+    and anova_p hold one value per group. Returns p-values shaped
+    [state, state, ...]. Pairs are only tested in groups whose ANOVA p-value
+    is below p_threshold and are 1.0 otherwise, unless p_threshold is None,
+    which tests every group; pairs involving a state without data in the
+    group are NaN. Studentized range p-values come from the shared
+    StudentizedRangeTable unless another table is passed in.
+    """
+    if studentized_range is None:
+        studentized_range = get_studentized_range_table()
+
+    present = count > 0
+    n_states = mean.shape[0]
+    pairwise = np.ones((n_states,) + mean.shape)
+    pairwise[~(present[:, None] & present[None, :])] = np.nan
+
+    if p_threshold is None:
+        significant = np.ones(np.shape(anova_p), dtype=bool)
+    else:
+        significant = anova_p < p_threshold
+    if not significant.any():
+        return pairwise
+
+    # [state, group] for the significant groups only
+    mean = mean[:, significant]
+    count = count[:, significant]
+    ms_within = ms_within[significant]
+    k = present[:, significant].sum(axis=0)
+    n = count.sum(axis=0)
+
+    # every unordered pair of present states, shaped [pair, group]
+    outer, inner = np.triu_indices(n_states, k=1)
+    tested = (count[outer] > 0) & (count[inner] > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se = np.sqrt((ms_within / 2) * (1 / count[outer] + 1 / count[inner]))
+        q = np.where(se != 0, np.abs(mean[outer] - mean[inner]) / se, 0.0)
+
+    p_values = np.ones(q.shape)
+    pair_k = np.broadcast_to(k, q.shape)[tested]
+    pair_df = np.broadcast_to(n - k, q.shape)[tested]
+    p_values[tested] = studentized_range.p_values(q[tested], pair_k, pair_df)
+
+    significant_pairwise = pairwise[:, :, significant]
+    significant_pairwise[outer, inner] = np.where(
+        tested, p_values, significant_pairwise[outer, inner]
+    )
+    significant_pairwise[inner, outer] = significant_pairwise[outer, inner]
+    pairwise[:, :, significant] = significant_pairwise
+    return pairwise
+
+
+def fdr_adjust(p_values):
+    """Benjamini-Hochberg adjusted p-values along the last axis.
+
+    Every series along the last axis (positions, for the position results)
+    is adjusted on its own, all of them at once. NaN p-values are not
+    counted as tests and stay NaN.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    order = np.argsort(p_values, axis=-1)  # NaN sorts last
+    ranked = np.take_along_axis(p_values, order, axis=-1)
+    n_tests = (~np.isnan(p_values)).sum(axis=-1, keepdims=True)
+    rank = np.arange(1, p_values.shape[-1] + 1)
+    with np.errstate(invalid="ignore"):
+        scaled = ranked * n_tests / rank
+    # running minimum from the largest p-value down keeps the adjusted
+    # values in the same order as the raw ones
+    adjusted = np.minimum(np.fmin.accumulate(scaled[..., ::-1], axis=-1)[..., ::-1], 1)
+    result = np.empty_like(p_values)
+    np.put_along_axis(result, order, adjusted, axis=-1)
+    result[np.isnan(p_values)] = np.nan
+    return result
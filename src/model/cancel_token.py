@@ -0,0 +1,46 @@
+import numpy as np
+from src.model.shared_arrays import SharedArrays, AttachedArrays
+
+
+class Cancelled(Exception):
+    """Raised where a run notices that its CancelToken has been cancelled."""
+
+
+class CancelToken:
+    """Flag set to stop a run, checked by the pipeline and its worker tasks.
+
+    The flag is a one byte array in shared memory, so tasks on worker
+    processes can check it through handles() as cheaply as the pipeline
+    thread does. cancel may be called from any thread or process; close
+    frees the flag once the run is over.
+    """
+
+    def __init__(self):
+        self.arrays = SharedArrays()
+        self.flag = self.arrays.create("cancelled", (1,), np.uint8, fill=0)
+
+    def cancel(self):
+        self.flag[0] = 1
+
+    def cancelled(self):
+        return bool(self.flag[0])
+
+    def check(self):
+        if self.cancelled():
+            raise Cancelled()
+
+    def handles(self):
+        return self.arrays.handles()
+
+    def close(self):
+        self.flag = None
+        self.arrays.close()
+
+
+def check_cancelled(handles):
+    """Raise Cancelled if the token with these handles (or None) is set."""
+    if handles is None:
+        return
+    with AttachedArrays(handles) as arrays:
+        if arrays["cancelled"][0]:
+            raise Cancelled()
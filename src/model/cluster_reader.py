@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    import pyarrow  # noqa: F401
+
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
+# columns of a DynamX cluster export the pipeline uses and the dtype each is
+# loaded as; File, RT, Modification and Fragment are never read. Strings
+# repeat across thousands of rows so they are categoricals, and values that
+# take part in the stats stay float64 so results do not depend on the loader
+CLUSTER_SCHEMA = {
+    "Protein": "category",
+    "Start": np.int32,
+    "End": np.int32,
+    "Sequence": "category",
+    "MaxUptake": np.float64,
+    "MHP": np.float64,
+    "State": "category",
+    "Exposure": np.float64,
+    "z": np.int16,
+    "Inten": np.float64,
+    "Center": np.float64,
+}
+
+# files bigger than this are read in chunks of CHUNK_ROWS rows, so only one
+# chunk of raw text is parsed at a time
+CHUNKED_READ_BYTES = 2**28
+CHUNK_ROWS = 10**6
+
+
+def read_cluster(path, engine="auto", chunksize=None):
+    """Read the columns of a cluster CSV the pipeline uses, with compact dtypes.
+
+    engine is passed to pd.read_csv; "auto" uses the multithreaded pyarrow
+    parser when pyarrow is installed and the file is read in one go. Files
+    over CHUNKED_READ_BYTES, or any file when chunksize is given, are read
+    chunksize rows at a time with the C parser, converting each chunk to the
+    schema before the next one is parsed.
+    """
+    if chunksize is None and os.path.getsize(path) > CHUNKED_READ_BYTES:
+        chunksize = CHUNK_ROWS
+    if engine == "auto":
+        engine = "pyarrow" if HAVE_PYARROW and chunksize is None else "c"
+
+    options = dict(usecols=list(CLUSTER_SCHEMA), dtype=CLUSTER_SCHEMA)
+    if chunksize is None:
+        data = pd.read_csv(path, engine=engine, **options)
+    else:
+        data = concat_chunks(
+            pd.read_csv(path, engine=engine, chunksize=chunksize, **options)
+        )
+    # usecols keeps file order, the pipeline expects the schema order
+    return data[list(CLUSTER_SCHEMA)]
+
+
+def concat_chunks(chunks):
+    # chunks infer their own categories, so they are unioned before concat
+    chunks = list(chunks)
+    categorical = [
+        column for column, dtype in CLUSTER_SCHEMA.items() if dtype == "category"
+    ]
+    for column in categorical:
+        union = union_categoricals(
+            [chunk[column] for chunk in chunks], sort_categories=True
+        ).categories
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(union)
+    return pd.concat(chunks, ignore_index=True)
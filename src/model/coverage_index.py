@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class CoverageIndex:
+    """Positions x peptide-row coverage of one protein, stored in CSR form.
+
+    A peptide row covers position i when Start < i <= End (the first residue
+    of a peptide back-exchanges too quickly to carry deuterium). The rows
+    covering position first_position + j are indices[indptr[j]:indptr[j + 1]],
+    in their original order, so the stats of every position are combined
+    without rescanning the peptides.
+
+    first_position and last_position default to the span of the rows; passing
+    them restricts the index to that window of positions, clipping the rows
+    that stick out of it.
+    """
+
+    def __init__(self, starts, ends, first_position=None, last_position=None):
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+
+        self.first_position = (
+            int(starts.min()) if first_position is None else first_position
+        )
+        self.last_position = int(ends.max()) if last_position is None else last_position
+        n_positions = self.last_position - self.first_position + 1
+
+        lows = np.maximum(starts + 1, self.first_position)
+        highs = np.minimum(ends, self.last_position)
+        lengths = np.maximum(highs - lows + 1, 0)
+        rows = np.repeat(np.arange(len(starts)), lengths)
+        # position of every (row, covered residue) pair relative to first_position
+        row_offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        positions = np.repeat(lows - self.first_position, lengths) + row_offsets
+
+        # stable sort keeps rows in their original order within each position
+        order = np.argsort(positions, kind="stable")
+        self.indices = rows[order]
+        self.indptr = np.zeros(n_positions + 1, dtype=np.int64)
+        np.cumsum(np.bincount(positions, minlength=n_positions), out=self.indptr[1:])
+
+        self.segment_starts = segment_starts(
+            starts, ends, self.first_position, self.last_position
+        )
+
+    def positions(self):
+        return range(self.first_position, self.last_position + 1)
+
+    def segments(self):
+        """Return the first position and length of every maximal run of
+        positions covered by exactly the same set of rows."""
+        lengths = np.diff(np.append(self.segment_starts, self.last_position + 1))
+        return self.segment_starts, lengths
+
+    def counts(self):
+        """Return the number of rows covering each position."""
+        return np.diff(self.indptr)
+
+
+def segment_starts(starts, ends, first_position, last_position):
+    """Return the first position of every maximal run of positions in
+    [first_position, last_position] covered by exactly the same rows."""
+    # the covering set only changes where a row starts or stops covering
+    boundaries = np.concatenate(([first_position], starts + 1, ends + 1))
+    return np.unique(
+        boundaries[(boundaries >= first_position) & (boundaries <= last_position)]
+    )
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+
+
+def default_cache_dir():
+    return os.environ.get(
+        "PYPAVED_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "pypaved"),
+    )
+
+
+def directory_nbytes(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class DiskCache:
+    """Directory of cache entries, least recently used evicted past max_bytes.
+
+    Every entry is a subdirectory named by its key, written in full to a
+    temporary directory and renamed into place so readers never see half an
+    entry. Using an entry touches it; when the entries add up to more than
+    max_bytes the ones used longest ago are deleted, always keeping the
+    newest.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Return the directory of the entry for key, or None."""
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        os.utime(path)
+        return path
+
+    def put(self, key, write):
+        """Create the entry for key by calling write(directory)."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            write(tmp_path)
+            os.rename(tmp_path, self.path(key))
+        except OSError:
+            # another process wrote the same entry first
+            if not os.path.isdir(self.path(key)):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+        return self.get(key)
+
+    def entries(self):
+        """Return (last use, bytes, path) of every entry, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self.path(name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            entries.append((os.path.getmtime(path), directory_nbytes(path), path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if nbytes <= self.max_bytes:
+                break
+            # entries still memory-mapped elsewhere may refuse deletion on
+            # some platforms; they are retried on the next eviction
+            shutil.rmtree(path, ignore_errors=True)
+            nbytes -= size
@@ -0,0 +1,190 @@
+import os
+import threading
+import traceback
+import numpy as np
+from src.model.cancel_token import CancelToken, Cancelled
+from src.model.executors import make_executor, shared_memory_limit
+from src.model.input_cache import InputCache
+from src.model.process_cluster_data import Model
+from src.model.progress import ProgressReporter
+from src.model.results_cache import ResultsCache
+from src.model.shared_arrays import SharedArrays
+
+
+class Engine:
+    """Models of the app, run in the engine process.
+
+    Requests are (request_id, command, args) tuples read from the requests
+    queue by serve, and every request is answered on the responses queue
+    with (request_id, status, value), status being "ok", "partial",
+    "cancelled" or "error". A file is processed on a thread of the engine so
+    cancel, prioritise and get_dataset requests are still answered while it
+    runs. A file whose results are cached is answered with "ok" straight
+    away; otherwise a process request is answered with a "partial" response
+    each time a protein is published, after which the new model serves the
+    datasets of the proteins published so far, and then with its final
+    response. Once a file is processed its model only keeps the results,
+    but the model of a cancelled run is kept with its finished stages, so
+    processing the same, unchanged file again resumes from them. The arrays
+    of a dataset are sent in shared memory, kept until the next dataset
+    request.
+    """
+
+    def __init__(self, responses, progress_queue):
+        self.responses = responses
+        self.progress_queue = progress_queue
+        self.executor = make_executor("auto", memory_limit=shared_memory_limit())
+        self.executor.warm()
+        self.input_cache = InputCache()
+        self.results_cache = ResultsCache()
+        # model datasets are served from, the run in progress, and the model
+        # and file signature of the last run if it was cancelled
+        self.model = None
+        self.running = None
+        self.cancelled = None
+        self.thread = None
+        self.cancel_token = None
+        self.dataset_arrays = None
+
+    def handle(self, request_id, command, args):
+        try:
+            if command == "process":
+                self.process(request_id, *args)
+            elif command == "get_dataset":
+                self.respond(request_id, "ok", self.get_dataset(*args))
+            elif command == "prioritise":
+                if self.running is not None:
+                    self.running.prioritise(*args)
+                self.respond(request_id, "ok", None)
+            elif command == "cancel":
+                if self.cancel_token is not None:
+                    self.cancel_token.cancel()
+                self.respond(request_id, "ok", None)
+            else:
+                raise ValueError(f"Unknown engine command: {command}")
+        except Exception:
+            self.respond(request_id, "error", traceback.format_exc())
+
+    def respond(self, request_id, status, value):
+        self.responses.put((request_id, status, value))
+
+    def new_model(self, path):
+        return Model(
+            path,
+            executor=self.executor,
+            input_cache=self.input_cache,
+            results_cache=self.results_cache,
+        )
+
+    def process(self, request_id, path):
+        if self.running is not None:
+            raise RuntimeError("A file is already being processed")
+        if self.thread is not None:
+            # done but for its response, which may still be being sent
+            self.thread.join()
+        signature = (path, file_signature(path))
+        self.cancel_token = CancelToken()
+        if self.cancelled is not None and self.cancelled[1] == signature:
+            self.running = self.cancelled[0]
+        else:
+            self.running = self.new_model(path)
+        self.cancelled = None
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(request_id, self.running, self.cancel_token, signature),
+        )
+        self.thread.start()
+
+    def run(self, request_id, model, cancel, signature):
+        def publish(protein):
+            self.model = model
+            self.respond(request_id, "partial", partial_lists(model))
+
+        try:
+            # hashing a large file takes a while, so the results cache is
+            # looked up here rather than by the caller
+            if not model.load_cached_results():
+                model.start_process(
+                    ProgressReporter(self.progress_queue), cancel, publish
+                )
+        except Cancelled:
+            # its proteins published so far went with the run
+            if self.model is model:
+                self.model = None
+            self.cancelled = (model, signature)
+            response = ("cancelled", None)
+        except Exception:
+            response = ("error", traceback.format_exc())
+        else:
+            # nothing reuses the stages of a finished run, only its results
+            model.release_stages()
+            self.model = model
+            response = ("ok", model_lists(model))
+        finally:
+            self.running = None
+            self.cancel_token = None
+            cancel.close()
+        # sent last, so a process request that follows it is not refused
+        self.respond(request_id, *response)
+
+    def get_dataset(self, protein, exposure, state="no_ref"):
+        self.free_dataset()
+        dataset = self.model.get_dataset(protein, exposure, state)
+        self.dataset_arrays = SharedArrays()
+        values = {}
+        for name, value in dataset["data"].items():
+            if isinstance(value, np.ndarray):
+                self.dataset_arrays.put(name, value)
+            else:
+                values[name] = value
+        return {
+            "arrays": self.dataset_arrays.handles(),
+            "values": values,
+            "min_max": tuple(float(limit) for limit in dataset["min_max"]),
+        }
+
+    def free_dataset(self):
+        if self.dataset_arrays is not None:
+            self.dataset_arrays.close()
+            self.dataset_arrays = None
+
+    def shutdown(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+        if self.thread is not None:
+            self.thread.join()
+        self.free_dataset()
+        self.executor.close()
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def model_lists(model):
+    states, exposures, proteins = model.get_states_protein_exposure_lists()
+    return (
+        [str(state) for state in states],
+        [float(exposure) for exposure in exposures],
+        [str(protein) for protein in proteins],
+    )
+
+
+def partial_lists(model):
+    """State and exposure lists of the proteins published so far, every
+    protein of the run, and the proteins published."""
+    states, exposures, ready = model_lists(model)
+    return states, exposures, [str(p) for p in model.partial_proteins], ready
+
+
+def serve(requests, responses, progress_queue):
+    """Answer requests until a shutdown request; the engine process's main."""
+    engine = Engine(responses, progress_queue)
+    while True:
+        request_id, command, args = requests.get()
+        if command == "shutdown":
+            engine.shutdown()
+            engine.respond(request_id, "ok", None)
+            return
+        engine.handle(request_id, command, args)
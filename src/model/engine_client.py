@@ -0,0 +1,144 @@
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+from src.model.progress import drain
+from src.model.shared_arrays import AttachedArrays
+
+
+class EngineError(Exception):
+    """Raised for a request the engine failed, with its traceback."""
+
+
+def run_engine(requests, responses, progress_queue):
+    # imported in the engine process only, so pandas and the stats stack are
+    # never loaded by the GUI
+    from src.model.engine import serve
+
+    serve(requests, responses, progress_queue)
+
+
+class EngineClient:
+    """GUI side of the engine process that reads and processes files.
+
+    The engine is started with spawn, so it imports nothing the GUI has
+    loaded and the GUI imports none of the model's dependencies. process
+    returns at once with a request id to poll for its responses, "partial"
+    ones as proteins are published and then the final one; the other
+    requests wait for their response. Progress events of a run are put on
+    progress_queue.
+    """
+
+    def __init__(self):
+        self.context = mp.get_context("spawn")
+        self.requests = self.context.Queue()
+        self.responses = self.context.Queue()
+        self.progress_queue = self.context.Queue()
+        self.request_ids = itertools.count()
+        # responses of every request not yet finished, put there by the
+        # reader thread, the only one reading the responses queue
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.reader = None
+        # a dataset's blocks are freed at the engine's next dataset request,
+        # so dataset requests are made one at a time
+        self.dataset_lock = threading.Lock()
+        self.process_handle = None
+
+    def start(self):
+        if self.process_handle is None:
+            self.process_handle = self.context.Process(
+                target=run_engine,
+                args=(self.requests, self.responses, self.progress_queue),
+                name="pypaved-engine",
+            )
+            self.process_handle.start()
+            self.reader = threading.Thread(target=self.read_responses, daemon=True)
+            self.reader.start()
+
+    def read_responses(self):
+        while True:
+            response = self.responses.get()
+            if response is None:
+                return
+            request_id, status, value = response
+            with self.pending_lock:
+                self.pending[request_id].put((status, value))
+
+    def send(self, command, *args):
+        self.start()
+        request_id = next(self.request_ids)
+        with self.pending_lock:
+            self.pending[request_id] = queue.Queue()
+        self.requests.put((request_id, command, args))
+        return request_id
+
+    def poll(self, request_id):
+        """Return the next (status, value) response to request_id, or None
+        while the engine has not sent one."""
+        try:
+            response = self.pending[request_id].get_nowait()
+        except queue.Empty:
+            return None
+        return self.received(request_id, response)
+
+    def wait(self, request_id):
+        return self.received(request_id, self.pending[request_id].get())
+
+    def received(self, request_id, response):
+        if response[0] != "partial":
+            # the last response to the request
+            with self.pending_lock:
+                del self.pending[request_id]
+        return response
+
+    def call(self, command, *args):
+        return result(*self.wait(self.send(command, *args)))
+
+    def process(self, path):
+        """Start processing path; poll the returned id for its responses.
+
+        Results cached by an earlier run are answered with "ok" at once.
+        Otherwise each protein published is answered with "partial" and the lists of
+        states and exposures published, every protein of the file and the
+        proteins published; the run ends with "ok" and the lists of states,
+        exposures and proteins, or with "cancelled".
+        """
+        # events left over from an earlier run
+        drain(self.progress_queue)
+        return self.send("process", path)
+
+    def prioritise(self, protein):
+        """Process protein before the others left in the run."""
+        self.call("prioritise", protein)
+
+    def cancel(self):
+        self.call("cancel")
+
+    def get_dataset(self, protein, exposure, state="no_ref"):
+        with self.dataset_lock:
+            status, value = self.wait(
+                self.send("get_dataset", protein, exposure, state)
+            )
+            value = result(status, value)
+            # copied before the next request lets the engine free the blocks
+            data = dict(value["values"])
+            with AttachedArrays(value["arrays"]) as arrays:
+                for name in value["arrays"]:
+                    data[name] = arrays[name].copy()
+        return {"data": data, "min_max": value["min_max"]}
+
+    def shutdown(self):
+        if self.process_handle is not None:
+            self.call("shutdown")
+            self.process_handle.join()
+            self.process_handle = None
+            # stops the reader
+            self.responses.put(None)
+            self.reader.join()
+
+
+def result(status, value):
+    if status == "error":
+        raise EngineError(value)
+    return value
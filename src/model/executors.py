@@ -0,0 +1,167 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from src.model.worker_pool import WorkerPool
+
+# estimated cost (positions x rows x states, summed over proteins) above which
+# auto mode runs a stage on threads, and above which it uses processes
+THREAD_COST = 2 * 10**7
+PROCESS_COST = 10**8
+# share of the free space of /dev/shm a workload may put in shared memory
+SHARED_MEMORY_FRACTION = 0.5
+
+
+class SerialExecutor:
+    """Runs every task in the calling thread, in order."""
+
+    name = "serial"
+    shared = False
+
+    def __init__(self):
+        self.workers = 1
+
+    def select(self, cost, nbytes=0):
+        return self
+
+    def warm(self):
+        pass
+
+    def submit(self, func, task, done):
+        """Run func(task) and pass (result, None) or (None, error) to done.
+
+        The other backends return at once and call done from one of their
+        threads when the task has finished.
+        """
+        try:
+            result = func(task)
+        except Exception as error:
+            done(None, error)
+        else:
+            done(result, None)
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ThreadExecutor:
+    """Runs tasks on a pool of threads of this process.
+
+    Tasks share the caller's arrays directly, so nothing is copied or
+    pickled; this pays off for the NumPy kernels that release the GIL.
+    """
+
+    name = "thread"
+    shared = False
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers)
+        return self.executor
+
+    def select(self, cost, nbytes=0):
+        return self
+
+    def warm(self):
+        self.start()
+
+    def submit(self, func, task, done):
+        def finished(future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                done(None, future.exception())
+            else:
+                done(future.result(), None)
+
+        self.start().submit(func, task).add_done_callback(finished)
+
+    def cancel(self):
+        # queued tasks are dropped, running ones stop at their next check
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+class AutoExecutor:
+    """Picks the serial, thread or process backend for each workload.
+
+    Every executor has select; the fixed backends return themselves. Stages
+    call select with the estimated cost of their work and the most bytes it
+    would have in shared memory at once. Small workloads run serially, where
+    starting tasks would cost more than the work, medium ones on threads and
+    large ones on processes. A workload over memory_limit bytes is kept off
+    the process backend, which would copy its arrays into shared memory; the
+    engine sets it from the free space of /dev/shm.
+    """
+
+    name = "auto"
+
+    def __init__(
+        self,
+        workers=None,
+        memory_limit=None,
+        thread_cost=THREAD_COST,
+        process_cost=PROCESS_COST,
+    ):
+        self.memory_limit = memory_limit
+        self.thread_cost = thread_cost
+        self.process_cost = process_cost
+        self.serial = SerialExecutor()
+        self.threads = ThreadExecutor(workers)
+        self.processes = WorkerPool(workers)
+        self.workers = self.processes.workers
+
+    def select(self, cost, nbytes=0):
+        if cost < self.thread_cost or self.workers == 1:
+            return self.serial
+        if cost < self.process_cost or (
+            self.memory_limit is not None and nbytes > self.memory_limit
+        ):
+            return self.threads
+        return self.processes
+
+    def warm(self):
+        # only the process pool is slow enough to start to be worth warming
+        self.processes.warm()
+
+    def cancel(self):
+        self.threads.cancel()
+        self.processes.cancel()
+
+    def close(self):
+        self.threads.close()
+        self.processes.close()
+
+
+def shared_memory_limit():
+    """Return the bytes a workload may put in shared memory, a share of the
+    free space of /dev/shm, or None where shared memory is not kept there."""
+    try:
+        stat = os.statvfs("/dev/shm")
+    except (AttributeError, OSError):
+        return None
+    return int(stat.f_bavail * stat.f_frsize * SHARED_MEMORY_FRACTION)
+
+
+def make_executor(mode="auto", workers=None, memory_limit=None):
+    """Return the executor for mode: "auto", "serial", "thread" or "process"."""
+    if mode == "auto":
+        return AutoExecutor(workers, memory_limit)
+    if mode == "serial":
+        return SerialExecutor()
+    if mode == "thread":
+        return ThreadExecutor(workers)
+    if mode == "process":
+        return WorkerPool(workers)
+    raise ValueError(f"Unknown executor mode: {mode}")
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from src.model.cluster_reader import read_cluster
+from src.model.disk_cache import DiskCache, default_cache_dir
+
+# part of every key; bump it when read_cluster or the layout of the column
+# files changes so entries written by older versions are never read
+INPUT_CACHE_VERSION = 1
+
+# file digests remembered by (path, size, modification time)
+MAX_REMEMBERED_DIGESTS = 256
+
+
+def file_digest(path, block_size=2**20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_key(path):
+    """Return the content hash and size of a file as one string."""
+    return f"{file_digest(path)}-{os.path.getsize(path)}"
+
+
+def write_frame(frame, directory):
+    # one .npy file per column (codes and categories for categoricals) so
+    # every column can be memory-mapped on its own; string columns are
+    # stored as categoricals
+    columns = []
+    for i, column in enumerate(frame.columns):
+        values = frame[column]
+        if values.dtype == object:
+            values = values.astype("category")
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, f"{i}.npy"), values.cat.codes.to_numpy())
+            np.save(
+                os.path.join(directory, f"{i}.categories.npy"),
+                values.cat.categories.to_numpy(dtype=str),
+            )
+            columns.append({"name": column, "categorical": True})
+        else:
+            np.save(os.path.join(directory, f"{i}.npy"), values.to_numpy())
+            columns.append({"name": column, "categorical": False})
+    with open(os.path.join(directory, "columns.json"), "w") as file:
+        json.dump(columns, file)
+
+
+def read_frame(directory):
+    with open(os.path.join(directory, "columns.json")) as file:
+        columns = json.load(file)
+    data = {}
+    for i, column in enumerate(columns):
+        # plain ndarray views of the maps, which pandas handles as any array
+        values = np.asarray(np.load(os.path.join(directory, f"{i}.npy"), mmap_mode="r"))
+        if column["categorical"]:
+            categories = np.load(os.path.join(directory, f"{i}.categories.npy"))
+            values = pd.Categorical.from_codes(values, categories.astype(object))
+        data[column["name"]] = values
+    # copy=False keeps the columns backed by the memory-mapped files
+    return pd.DataFrame(data, copy=False)
+
+
+class InputCache:
+    """Parsed cluster files kept on disk as memory-mapped column arrays.
+
+    Entries are keyed by the size and a hash of the file's content, so a
+    file that is renamed or copied still hits and an edited one never does.
+    The hash of a file is remembered by path, size and modification time,
+    which lets an unchanged file be reopened without reading it. A hit maps
+    the columns instead of parsing the CSV; the frame's columns are
+    read-only views of the cache files. Entries past max_bytes are evicted
+    least recently used first.
+    """
+
+    def __init__(self, directory=None, max_bytes=2**32):
+        if directory is None:
+            directory = os.path.join(default_cache_dir(), "inputs")
+        self.cache = DiskCache(directory, max_bytes)
+        self.digests_path = os.path.join(directory, ".digests.json")
+        self.digests = self.load_digests()
+
+    def load(self, path):
+        """Return the read_cluster frame of path, from the cache if possible."""
+        key = self.key(path)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return read_frame(entry)
+        data = read_cluster(path)
+        self.cache.put(key, lambda directory: write_frame(data, directory))
+        return data
+
+    def key(self, path):
+        return f"v{INPUT_CACHE_VERSION}-{self.content_key(path)}"
+
+    def content_key(self, path):
+        """content_key(path), remembered while the file is unchanged."""
+        stat = os.stat(path)
+        file_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = self.digests.get(file_key)
+        if digest is None:
+            digest = file_digest(path)
+            self.digests[file_key] = digest
+            self.save_digests()
+        return f"{digest}-{stat.st_size}"
+
+    def load_digests(self):
+        try:
+            with open(self.digests_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_digests(self):
+        # dicts keep insertion order, so the oldest digests are dropped
+        digests = list(self.digests.items())[-MAX_REMEMBERED_DIGESTS:]
+        self.digests = dict(digests)
+        os.makedirs(self.cache.directory, exist_ok=True)
+        tmp_path = self.digests_path + f".{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.digests, file)
+        os.replace(tmp_path, self.digests_path)
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+import threading
+import numpy as np
+
+
+def owned_nbytes(value):
+    """Bytes of the numpy arrays in value that are not views of other arrays."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes if value.base is None else 0
+    if isinstance(value, dict):
+        return sum(owned_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(owned_nbytes(item) for item in value)
+    return 0
+
+
+class LRUCache:
+    """Least recently used cache bounded by entry count and/or bytes.
+
+    Values are built on the first get for their key. The size of an entry is
+    the memory its arrays own, so entries that are only views of arrays held
+    elsewhere count as free and only the entry limit applies to them.
+
+    The cache may be shared between threads. A value is built outside the
+    lock, so a slow build does not hold up gets of other keys; when two
+    threads build the same key the first value stored is kept.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+
+        value = build()
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            size = owned_nbytes(value)
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            self.evict()
+        return value
+
+    def evict(self):
+        # the newest entry is always kept, even if it alone is over max_bytes
+        while len(self.entries) > 1 and (
+            (self.max_entries is not None and len(self.entries) > self.max_entries)
+            or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+        ):
+            _, (_, size) = self.entries.popitem(last=False)
+            self.nbytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
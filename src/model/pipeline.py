@@ -0,0 +1,60 @@
+class Stage:
+    """One named step of a Pipeline.
+
+    run is called as run(progress, *inputs, **parameters) with the
+    outputs of the stages named in inputs and the values of the pipeline
+    parameters named in parameters, and returns the stage's output. It must
+    not modify its inputs, which stay memoized for the stages after it.
+    """
+
+    def __init__(self, name, run, inputs=(), parameters=()):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.parameters = list(parameters)
+
+
+class Pipeline:
+    """Stages run in order with the output of every stage memoized.
+
+    A stage's key is made of the keys of its inputs and the values of its
+    parameters, so a stage only runs again when one of its parameters, or
+    a parameter of a stage before it, has changed. Changing a downstream
+    parameter therefore re-runs only the stages from the first one that
+    uses it.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        # stage name -> (key, output) of its last run
+        self.memo = {}
+
+    def run(self, parameters, progress, cancel=None):
+        """Run the stages that are out of date; return every stage's output.
+
+        The CancelToken cancel, when given, is checked before every stage. A
+        stage that raises leaves the memo of the stages before it intact.
+        """
+        keys = {}
+        outputs = {}
+        for stage in self.stages:
+            if cancel is not None:
+                cancel.check()
+            key = (
+                tuple(keys[name] for name in stage.inputs),
+                tuple(parameters[name] for name in stage.parameters),
+            )
+            memo = self.memo.get(stage.name)
+            if memo is None or memo[0] != key:
+                output = stage.run(
+                    progress,
+                    *[outputs[name] for name in stage.inputs],
+                    **{name: parameters[name] for name in stage.parameters},
+                )
+                self.memo[stage.name] = (key, output)
+            keys[stage.name] = key
+            outputs[stage.name] = self.memo[stage.name][1]
+        return outputs
+
+    def clear(self):
+        self.memo.clear()
@@ -1,172 +1,190 @@
-from scipy.stats import f
-from statsmodels.stats.libqsturng import psturng
 import pandas as pd
 import numpy as np
-import multiprocessing as mp
-import math
-
+from src.model.coverage_index import CoverageIndex, segment_starts
+from src.model.position_statistics import combine_statistics
+from src.model.batch_stats import batch_anova, batch_tukey
+from src.model.result_store import ProteinResult
+from src.model.shared_arrays import SharedArrays, AttachedArrays
+
+
+class PositionJob:
+    """Inputs and outputs of the position stage of one protein.
+
+    windows() plans the protein as windows of positions from the peptide
+    coordinates alone. open() puts the peptide columns the workers need and
+    the preallocated output arrays in a SharedArrays object (in shared
+    memory when shared is True), after which task() turns a window into a
+    task for process_position_window. result() collects the outputs once
+    every window has run and close() frees the arrays; it must be called
+    once the job is finished with, opened or not.
+    """
+
+    def __init__(self, protein, protein_group, shared=False):
+        self.protein = protein
+        self.protein_group = protein_group
+        self.shared = shared
+        starts = protein_group["Start"].to_numpy(dtype=np.int64)
+        ends = protein_group["End"].to_numpy(dtype=np.int64)
+        self.first_position = int(starts.min())
+        self.last_position = int(ends.max())
+        self.n_positions = self.last_position - self.first_position + 1
+        self.n_rows = len(protein_group)
+
+        self.state_codes, self.states = pd.factorize(protein_group["State"], sort=True)
+        self.exposure_codes, self.exposures = pd.factorize(
+            protein_group["Exposure"], sort=True
+        )
 
-def position_iterable(positions, protein_group):
-    for i in positions:
-        yield i, protein_group[
-            (protein_group["Start"] < i) & (protein_group["End"] >= i)
-        ]
+        # positions covered by the same peptides give identical stats, so
+        # windows are made of whole coverage segments
+        self.segments = segment_starts(
+            starts, ends, self.first_position, self.last_position
+        )
+        self.arrays = None
+        self.handles = None
+
+    def open(self):
+        """Create the arrays of the job, unless it is already open."""
+        if self.arrays is not None:
+            return
+        protein_group = self.protein_group
+        n_states, n_exposures = len(self.states), len(self.exposures)
+        self.arrays = SharedArrays(self.shared)
+        try:
+            self.arrays.put("start", protein_group["Start"].to_numpy(np.int64))
+            self.arrays.put("end", protein_group["End"].to_numpy(np.int64))
+            self.arrays.put("state", self.state_codes)
+            self.arrays.put("exposure", self.exposure_codes)
+            self.arrays.put("count", protein_group["Count"].to_numpy(np.float64))
+            self.arrays.put(
+                "mean", protein_group["Rel. Uptake Mean"].to_numpy(np.float64)
+            )
+            self.arrays.put(
+                "variance", protein_group["Rel. Uptake Variance"].to_numpy(np.float64)
+            )
+            shape = (n_states, n_exposures, self.n_positions)
+            self.arrays.create("combined_mean", shape)
+            self.arrays.create("combined_variance", shape)
+            self.arrays.create("combined_count", shape)
+            self.arrays.create("anova", (n_exposures, self.n_positions))
+            self.arrays.create(
+                "tukey", (n_states, n_states, n_exposures, self.n_positions)
+            )
+        except BaseException:
+            self.close()
+            raise
+        self.handles = self.arrays.handles()
+
+    def cost(self):
+        """Estimated work of the whole protein: positions x rows x states."""
+        return self.n_positions * self.n_rows * len(self.states)
+
+    def windows(self, n_windows):
+        """Split the protein into at most n_windows windows of about as many
+        segments each, as (protein, first position, last position)."""
+        n_segments = len(self.segments)
+        block_size = -(-n_segments // max(min(n_windows, n_segments), 1))
+        windows = []
+        for start, stop in segment_blocks(n_segments, block_size):
+            first = int(self.segments[start])
+            last = (
+                int(self.segments[stop]) - 1
+                if stop < n_segments
+                else self.last_position
+            )
+            windows.append((self.protein, first, last))
+        return windows
+
+    def task(self, window):
+        """Task for process_position_window of a window of the open job."""
+        _, first, last = window
+        return (
+            self.handles,
+            self.protein,
+            len(self.states),
+            len(self.exposures),
+            self.first_position,
+            first,
+            last,
+        )
 
+    def result(self):
+        return ProteinResult(
+            np.asarray(self.states),
+            np.asarray(self.exposures),
+            self.first_position,
+            np.array(self.arrays["combined_mean"]),
+            np.array(self.arrays["combined_variance"]),
+            np.array(self.arrays["combined_count"]),
+            np.array(self.arrays["anova"]),
+            np.array(self.arrays["tukey"]),
+        )
 
-def process_protein_to_position(protein_group, progress_callback):
-    min_position = protein_group["Start"].min()
-    max_position = protein_group["End"].max()
-    progress_callback.send(
-        (f"Processing {protein_group.name}", f"{max_position-min_position} positions")
+    def close(self):
+        if self.arrays is not None:
+            self.arrays.close()
+            self.arrays = None
+            self.handles = None
+
+
+def estimate_position_job(protein_group):
+    """Return the estimated cost of the position stage of a protein, as
+    positions x rows x states, and the bytes of its input and output arrays."""
+    n_positions = protein_group["End"].max() - protein_group["Start"].min() + 1
+    n_rows = len(protein_group)
+    n_states = protein_group["State"].nunique()
+    n_exposures = protein_group["Exposure"].nunique()
+    cost = n_positions * n_rows * n_states
+    nbytes = 8 * (
+        7 * n_rows + n_exposures * n_positions * (1 + n_states * (3 + n_states))
     )
-    range_values = range(min_position, max_position + 1)
-
-    iterable = position_iterable(range_values, protein_group)
-
-    with mp.Pool() as pool:
-        results = pool.map(
-            process_positions,
-            [(iteration, progress_callback) for iteration in iterable],
+    return int(cost), int(nbytes)
+
+
+def segment_blocks(n_segments, block_size):
+    for start in range(0, n_segments, block_size):
+        yield start, min(start + block_size, n_segments)
+
+
+def process_position_window(task):
+    """Combine the peptides covering positions first..last of a protein, run
+    ANOVA and Tukey on them and write the results into the output arrays."""
+    handles, _, n_states, n_exposures, origin, first, last = task
+    with AttachedArrays(handles) as arrays:
+        starts = arrays["start"]
+        ends = arrays["end"]
+        rows = np.flatnonzero((starts < last) & (ends >= first))
+        coverage = CoverageIndex(starts[rows], ends[rows], first, last)
+        mean, variance, count = combine_statistics(
+            coverage,
+            arrays["state"][rows],
+            arrays["exposure"][rows],
+            arrays["count"][rows],
+            arrays["mean"][rows],
+            arrays["variance"][rows],
+            n_states,
+            n_exposures,
         )
 
-    combined_df = pd.concat(results, ignore_index=True)
-    
-    return combined_df
-
-
-def process_positions(args):
-    iteration, progress_callback = args
-    i, position_rows = iteration
-
-    # progress_callback.send(("Processing position:", i))
-
-    # at this point we have all states and exposures for all peptides covering this position
-    if position_rows.shape[0] > 0:
-        anovas = (
-            # pass each exposure for calculating ANOVA between states
-            position_rows.groupby("Exposure")
-            .apply(calc_anova, include_groups=False)
-            .reset_index()
-        )
-        anovas["Position"] = i
-        tukey_groups = (
-            anovas.groupby("Exposure")
-            .apply(calc_tukey, include_groups=False)
-            .reset_index()
+        # positions covered by the same peptides give identical stats, so
+        # only the first position of each coverage segment is tested
+        segment_starts, segment_lengths = coverage.segments()
+        offsets = segment_starts - first
+        _, anova_p, ms_within = batch_anova(
+            mean[..., offsets], variance[..., offsets], count[..., offsets]
         )
-        stats = pd.merge(anovas, tukey_groups, on=["Exposure", "State"])
-        # TODO can drop ms_within column
-        return stats
-
-
-def combine_means_variance_count(position_data_per_state):
-    # receives a dataframe  with all the peptides for that state
-
-    # calculate combined mean
-    combined_mean = (
-        position_data_per_state["Count"] * position_data_per_state["Rel. Uptake Mean"]
-    ).sum() / position_data_per_state["Count"].sum()
-    # calculate combined variance
-    combined_within = (
-        (position_data_per_state["Count"] - 1)
-        * position_data_per_state["Rel. Uptake Variance"]
-    ).sum()
-    combined_between = (
-        position_data_per_state["Count"]
-        * (position_data_per_state["Rel. Uptake Mean"] - combined_mean) ** 2
-    ).sum()
-    denominator = (position_data_per_state["Count"] - 1).sum() + 1
-    combined_variance = (combined_within + combined_between) / denominator
-    # calulate combined count
-    combined_count = position_data_per_state["Count"].sum()
-    # return df with combined mean, combined variance and count
-
-    return pd.Series(
-        {
-            "Combined Mean": combined_mean,
-            "Combined Variance": combined_variance,
-            "Combined Count": combined_count,
-        }
-    )
-
-
-def calc_anova(exposure_group):
-    # here exposure group contains sequence, start, end, state, MHP, MaxUptake, Center Mean, Center Variance, Count ...
-    # need to return state from original exposure_group df
-    means = (
-        exposure_group.groupby(["State"])
-        .apply(
-            # change this to __combine_means_variance_count
-            combine_means_variance_count,
-            include_groups=False,
+        # every pair is tested whatever the ANOVA p-value, so the
+        # significance threshold can be applied when the results are shown
+        tukeys = batch_tukey(
+            mean[..., offsets], count[..., offsets], ms_within, anova_p, None
         )
-        .reset_index()
-    )
 
-    # here means contains state, combined variance, combined mean and combined count
-
-    grand_mean = (means["Combined Mean"] * means["Combined Count"]).sum() / means[
-        "Combined Count"
-    ].sum()
-
-    ss_between = (
-        means["Combined Count"] * ((means["Combined Mean"] - grand_mean) ** 2)
-    ).sum()
-    df_between = means.shape[0] - 1
-    ms_between = ss_between / df_between if df_between != 0 else 0
-
-    ss_within = ((means["Combined Count"] - 1) * means["Combined Variance"]).sum()
-    df_within = means["Combined Count"].sum() - means.shape[0]
-    ms_within = ss_within / df_within if df_within != 0 else 0
-
-    f_stat = ms_between / ms_within if ms_within != 0 else 0
-
-    p_value = 1 - f.cdf(f_stat, df_between, df_within)
-
-    means["ANOVA"] = p_value
-
-    means["ms_within"] = ms_within
-    means = means.set_index("State")
-    return means
-
-
-def calc_tukey(group):
-    tukeys = pd.DataFrame()
-    tukeys["State"] = group["State"]
-
-    for state in tukeys["State"]:
-        tukeys[state] = [1.0] * len(tukeys["State"])
-
-    anova_p = group.iloc[0]["ANOVA"]
-    p_threshold = 0.05
-    if anova_p < p_threshold:
-        ms_within = group.iloc[0]["ms_within"]
-        k = len(group.index)
-        n = group["Combined Count"].sum()
-
-        for outer_index, outer_row in group.iterrows():
-            for inner_index, inner_row in group.iterrows():
-                if outer_index != inner_index:
-                    se = math.sqrt(
-                        (ms_within / 2)
-                        * (
-                            1 / outer_row["Combined Count"]
-                            + 1 / inner_row["Combined Count"]
-                        )
-                    )
-                    mean_diff = abs(
-                        outer_row["Combined Mean"] - inner_row["Combined Mean"]
-                    )
-                    q = mean_diff / se if se != 0 else 0
-
-                    try:
-                        p_tukey = psturng(q, k, n - k)
-                        if isinstance(p_tukey, np.ndarray):
-                            p_tukey = p_tukey[0]
-                        tukeys.loc[outer_index, inner_row["State"]] = p_tukey
-                    except KeyError:
-                        continue
-
-    tukeys = tukeys.set_index("State")
-
-    return tukeys
+        # expand segments back to positions: [..., segment] -> [..., position]
+        segment_of_position = np.repeat(np.arange(len(offsets)), segment_lengths)
+        window = slice(first - origin, last - origin + 1)
+        arrays["combined_mean"][..., window] = mean
+        arrays["combined_variance"][..., window] = variance
+        arrays["combined_count"][..., window] = count
+        arrays["anova"][:, window] = anova_p[:, segment_of_position]
+        arrays["tukey"][..., window] = tukeys[..., segment_of_position]
+    return last - first + 1
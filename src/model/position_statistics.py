@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def combine_statistics(
+    coverage,
+    state_codes,
+    exposure_codes,
+    counts,
+    means,
+    variances,
+    n_states,
+    n_exposures,
+):
+    """Combine every peptide covering each position in a single pass.
+
+    Takes the peptide columns as plain arrays, indexed by the row numbers in
+    coverage, and returns the combined mean, variance and count shaped
+    [state, exposure, position] over the positions of coverage. Cells
+    without any covering peptide have a count of 0 and NaN mean and
+    variance.
+
+    Count, count x mean and (count - 1) x variance are additive over the rows
+    covering a position, so they are summed for all states, exposures and
+    positions at once with np.bincount over the coverage entries. The spread
+    of peptide means around the combined mean is summed in a second pass
+    rather than derived from a sum of squares, which keeps the results equal
+    to a per-position calculation to rounding error.
+    """
+    n_positions = coverage.last_position - coverage.first_position + 1
+    shape = (n_states, n_exposures, n_positions)
+    size = int(np.prod(shape))
+
+    # one entry per (covered position, covering row) pair
+    rows = coverage.indices
+    entry_positions = np.repeat(np.arange(n_positions), coverage.counts())
+    cells = np.ravel_multi_index(
+        (state_codes[rows], exposure_codes[rows], entry_positions), shape
+    )
+
+    def cell_sum(weights):
+        return np.bincount(cells, weights=weights, minlength=size)
+
+    combined_count = cell_sum(counts[rows])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        combined_mean = cell_sum(counts[rows] * means[rows]) / combined_count
+        combined_within = cell_sum((counts[rows] - 1) * variances[rows])
+        combined_between = cell_sum(
+            counts[rows] * (means[rows] - combined_mean[cells]) ** 2
+        )
+        denominator = cell_sum(counts[rows] - 1) + 1
+        combined_variance = (combined_within + combined_between) / denominator
+    combined_variance[combined_count == 0] = np.nan
+
+    return (
+        combined_mean.reshape(shape),
+        combined_variance.reshape(shape),
+        combined_count.reshape(shape),
+    )
@@ -1,125 +1,246 @@
+import threading
 import pandas as pd
 import numpy as np
-from src.model.position_processor import process_protein_to_position
-
+from src.model.cluster_reader import read_cluster
+from src.model.input_cache import content_key
+from src.model.results_cache import results_key
+from src.model.scheduler import process_proteins_to_positions
+from src.model.result_store import ResultStore
+from src.model.lru_cache import LRUCache
+from src.model.pipeline import Pipeline, Stage
+from src.model.progress import ProgressReporter
 
 # import src.controller.Controller
 
+# bump when a change to the pipeline changes its results, so results cached
+# by earlier versions are not reused
+PIPELINE_VERSION = 2
+
 
 class Model:
-    def __init__(self, path):
-        # read in csv data to dataframe
-        self.data = pd.read_csv(path)
+    def __init__(
+        self,
+        path,
+        executor=None,
+        input_cache=None,
+        results_cache=None,
+        exposure_decimals=2,
+        dataset_cache_entries=256,
+        dataset_cache_bytes=2**28,
+    ):
+        self.path = path
+        self.input_cache = input_cache
+        self.results_cache = results_cache
+        # exposures are rounded to this many decimals before grouping
+        self.exposure_decimals = exposure_decimals
+        # cluster data, read by start_process
+        self.data = None
+        # executor owned by the app that the stats stages run on, None runs
+        # them serially in-process
+        self.executor = executor
+        # CancelToken of the run in progress
+        self.cancel_token = None
+        # callback given every protein's results as they are published, and
+        # the protein whose positions are processed first
+        self.on_protein = None
+        self.priority = None
+        # proteins published so far by the run in progress, and every
+        # protein it processes
+        self.partial_results = None
+        self.partial_proteins = []
+        # datasets may be requested from another thread while a run publishes
+        self.lock = threading.Lock()
         # calculated m/z of single charge
         self.summary_data = None
-        self.position_data = None
-        self.paved_datasets = {}
+        self.results = None
+        # datasets are built when first requested and the most recently used
+        # kept, bounded by count and by the bytes of the arrays they own
+        self.paved_datasets = LRUCache(
+            max_entries=dataset_cache_entries, max_bytes=dataset_cache_bytes
+        )
+        self.min_max = {}
 
-    def start_process(self, progress_callback):
-        progress_callback.send(("Processing measurements:", "Calculating MH+"))
-        self.data["Center MH+"] = self.__calculate_mh1plus(
-            self.data["z"], self.data["Center"]
+        # every stage's output is memoized, so after a parameter change only
+        # the stages from the first one using it are run again
+        self.pipeline = Pipeline(
+            [
+                Stage("data", self.__read_data),
+                Stage(
+                    "measurements",
+                    self.__calc_measurements,
+                    ["data"],
+                    ["exposure_decimals"],
+                ),
+                Stage("summary", self.__calc_summary_stage, ["measurements"]),
+                Stage("uptakes", self.__calc_uptakes_stage, ["summary"]),
+                Stage("positions", self.__calc_positions_stage, ["uptakes"]),
+            ]
         )
-        self.data["Exposure"] = self.data["Exposure"].round(2)
-        progress_callback.send(("Processing measurements:", "calculating summary data"))
-
-        self.summary_data = (
-            self.data.groupby(
-                [
-                    "Protein",
-                    "Sequence",
-                    "Start",
-                    "End",
-                    "Exposure",
-                    "State",
-                    "MaxUptake",
-                    "MHP",
-                ]
-            )
-            .apply(self.__calc_summary_data, include_groups=False)
-            .reset_index()
+
+    def start_process(self, progress=None, cancel=None, on_protein=None):
+        """Run the stages of the pipeline that are out of date for the
+        current parameters and publish their results, reporting to the
+        ProgressReporter progress.
+
+        Cancelling the CancelToken cancel stops the run with Cancelled at
+        the next stage or position task; the model keeps the results it had
+        before and the stages completed so far stay memoized. While the
+        positions are processed every protein is published to
+        partial_results as it completes, and on_protein(protein) is called,
+        so its datasets can be shown before the run has finished.
+        """
+        if progress is None:
+            progress = ProgressReporter()
+        self.cancel_token = cancel
+        self.on_protein = on_protein
+        try:
+            self.__run_pipeline(progress)
+        finally:
+            self.cancel_token = None
+            self.on_protein = None
+            self.partial_results = None
+            self.partial_proteins = []
+            progress.close()
+
+    def prioritise(self, protein):
+        """Process the positions of protein before those of the others; may
+        be called while the positions are being processed."""
+        self.priority = protein
+
+    def __run_pipeline(self, progress):
+        outputs = self.pipeline.run(self.parameters(), progress, self.cancel_token)
+        self.data = outputs["data"]
+        self.summary_data = outputs["uptakes"]
+        if self.results is not outputs["positions"]:
+            with self.lock:
+                self.results = outputs["positions"]
+                self.paved_datasets.clear()
+                self.min_max = {}
+            if self.results_cache is not None:
+                progress.start("Saving results")
+                self.results_cache.save(
+                    self.results_key(), self.summary_data, self.results
+                )
+
+    def release_stages(self):
+        """Drop the memoized stage outputs and the cluster data, keeping the
+        results; the next start_process runs every stage again."""
+        self.pipeline.clear()
+        self.data = None
+
+    def set_parameters(self, **parameters):
+        """Change parameters; the next start_process only re-runs the stages
+        that depend on them."""
+        for name, value in parameters.items():
+            if name not in self.parameters():
+                raise ValueError(f"Unknown parameter: {name}")
+            setattr(self, name, value)
+
+    def __read_data(self, progress):
+        progress.start("Reading cluster file")
+        # read the columns of the csv the pipeline uses, with compact dtypes,
+        # mapped from the input cache when the file has been read before
+        if self.input_cache is None:
+            return read_cluster(self.path)
+        return self.input_cache.load(self.path)
+
+    def __calc_measurements(self, progress, data, exposure_decimals):
+        progress.start("Calculating MH+")
+        return data.assign(
+            **{
+                "Center MH+": self.__calculate_mh1plus(data["z"], data["Center"]),
+                "Exposure": data["Exposure"].round(exposure_decimals),
+            }
+        )
+
+    def __calc_summary_stage(self, progress, measurements):
+        progress.start("Calculating summary data")
+        return self.__calc_summary_data(
+            measurements,
+            [
+                "Protein",
+                "Sequence",
+                "Start",
+                "End",
+                "Exposure",
+                "State",
+                "MaxUptake",
+                "MHP",
+            ],
         )
 
+    def __calc_uptakes_stage(self, progress, summary):
         # calculate absolute and relative uptakes (zero time point is reference)
-        progress_callback.send(
-            ("Processing measurements", "calculating fractional update")
+        progress.start("Calculating fractional uptake")
+        return self.__calc_fractional_uptakes(
+            summary,
+            ["Protein", "Sequence", "Start", "End", "State", "MHP"],
+            progress,
         )
 
-        self.summary_data = (
-            self.summary_data.groupby(
-                ["Protein", "Sequence", "Start", "End", "State", "MHP"]
+    def __calc_positions_stage(self, progress, uptakes):
+        # calculate stats (ANOVA and Tukey for each protein position)
+        protein_groups = list(uptakes.groupby("Protein", observed=True))
+        self.partial_proteins = [protein for protein, _ in protein_groups]
+        self.partial_results = ResultStore({})
+        return ResultStore(
+            process_proteins_to_positions(
+                protein_groups,
+                progress,
+                self.executor,
+                self.cancel_token,
+                self.__priority,
+                self.__publish_protein,
             )
-            .apply(self.__calc_fractional_uptakes, include_groups=False)
-            .reset_index()
         )
 
-        # calculate stats (ANOVA and Tukeyfor each protein position)
-        progress_callback.send(("Position calculations", "processing proteins"))
+    def __priority(self):
+        # without a protein selected the first one goes first, so there is
+        # something to show early in the run
+        if self.priority is None and self.partial_proteins:
+            return self.partial_proteins[0]
+        return self.priority
 
-        self.position_data = (
-            self.summary_data.groupby("Protein")
-            .apply(
-                process_protein_to_position,
-                progress_callback,
-                include_groups=False,
-            )
-            .reset_index()
+    def __publish_protein(self, protein, result):
+        with self.lock:
+            self.partial_results.proteins[protein] = result
+            if self.results is None:
+                # the no reference min_max spans the proteins published so far
+                self.paved_datasets.clear()
+                self.min_max.pop("no_ref", None)
+        if self.on_protein is not None:
+            self.on_protein(protein)
+
+    def current_results(self):
+        """Results datasets are made from: those of the last completed run,
+        or the proteins published so far by the first run."""
+        if self.results is None:
+            return self.partial_results
+        return self.results
+
+    def parameters(self):
+        return {"exposure_decimals": self.exposure_decimals}
+
+    def results_key(self):
+        key = (
+            content_key(self.path)
+            if self.input_cache is None
+            else self.input_cache.content_key(self.path)
         )
-        progress_callback.send(("Finished processing proteins", "Gathering data..."))
-
-        # TODO move following code to make_datasets function
-        # make datasets one for each protein
-        # protein -> (non-)reference -> exposure -> data, min & max
-        # one non-reference
-        unique_proteins = self.position_data["Protein"].unique().tolist()
-        unique_exposures = self.position_data["Exposure"].unique().tolist()
-        unique_states = self.position_data["State"].unique().tolist()
-        # one for each state as reference
-        for protein in unique_proteins:
-            progress_callback.send(("Getting datasets for sequence", protein))
-            self.paved_datasets[protein] = {}
-            for exposure in unique_exposures:
-                progress_callback.send(
-                    (
-                        "Getting datasets for sequence",
-                        f"{protein}, exposure {exposure}",
-                    )
-                )
-                self.paved_datasets[protein][exposure] = {"no_ref": {}}
-                no_ref_data = self.get_absolute_uptake_data(protein, exposure)
-                self.paved_datasets[protein][exposure]["no_ref"]["data"] = no_ref_data
-                y_max = (
-                    self.position_data["Combined Mean"]
-                    + self.position_data["Combined Variance"]
-                ).max()
-                y_min = (
-                    self.position_data["Combined Mean"]
-                    + self.position_data["Combined Variance"]
-                ).min()
-                self.paved_datasets[protein][exposure]["no_ref"]["min_max"] = (
-                    y_min,
-                    y_max,
-                )
-                ref_min = 0
-                ref_max = 0
-                for state in unique_states:
-                    self.paved_datasets[protein][exposure][state] = {}
-                    state_data = self.get_absolute_uptake_data(
-                        protein, exposure, state=state
-                    )
-                    self.paved_datasets[protein][exposure][state]["data"] = state_data
-                    y_max = (
-                        state_data["Combined Mean"] + state_data["Combined Variance"]
-                    ).max()
-                    y_min = (
-                        state_data["Combined Mean"] + state_data["Combined Variance"]
-                    ).min()
-                    if y_max > ref_max:
-                        ref_max = y_max
-                    if y_min < ref_min:
-                        ref_min = y_min
-                self.paved_datasets[protein]["ref_min_max"] = (ref_min, ref_max)
-        progress_callback.send("DONE")
+        return results_key(key, PIPELINE_VERSION, self.parameters())
+
+    def load_cached_results(self):
+        """Load the results of an earlier run of this file and parameters
+        from the results cache; returns False when there are none."""
+        if self.results_cache is None:
+            return False
+        cached = self.results_cache.load(self.results_key())
+        if cached is None:
+            return False
+        self.summary_data, self.results = cached
+        self.paved_datasets.clear()
+        self.min_max = {}
+        return True
 
     def __calculate_mh1plus(self, z: int, center: float) -> float:
         f_center = center
@@ -127,103 +248,124 @@ class Model:
         thompson = f_center * i_charge - ((z - 1) * 1.0078)
         return thompson
 
-    def __calc_summary_data(self, group: pd.DataFrame) -> pd.Series:
-        # self.controller.update_progress(
-        #     "Processing measurements:", "Summarising replicates"
-        # )
+    def __calc_summary_data(self, data: pd.DataFrame, keys: list) -> pd.DataFrame:
+        # intensity weighted mean and variance of Center MH+ for every group of
+        # replicate measurements, summed over group codes rather than applied
+        # group by group
+        grouped = data.groupby(keys, observed=True)
+        codes = grouped.ngroup().to_numpy()
+        in_group = codes >= 0
+        codes = codes[in_group]
+        weights = data["Inten"].to_numpy()[in_group]
+        values = data["Center MH+"].to_numpy()[in_group]
 
-        weights = group["Inten"]
-        count = len(group)
+        summary = grouped.size().index.to_frame(index=False)
+        sum_weights = np.bincount(codes, weights=weights)
+        average = np.bincount(codes, weights=weights * values) / sum_weights
+        # deviations from the group mean rather than sum(w * x**2), which loses
+        # precision on masses of thousands of Da with variances of ~1e-4
+        variance = (
+            np.bincount(codes, weights=weights * (values - average[codes]) ** 2)
+            / sum_weights
+        )
 
-        average = np.average(group["Center MH+"], weights=weights)
-        variance = np.average((group["Center MH+"] - average) ** 2, weights=weights)
+        summary["Center Mean"] = average
+        summary["Center Variance"] = variance
+        summary["Count"] = np.bincount(codes).astype(np.float64)
+        return summary
 
-        return pd.Series(
-            {
-                "Center Mean": average,
-                "Center Variance": variance,
-                "Count": int(count),
-            }
+    def __calc_fractional_uptakes(
+        self, summary: pd.DataFrame, keys: list, progress
+    ) -> pd.DataFrame:
+        # join every row to the zero time point of its peptide and state
+        reference = (
+            summary.loc[
+                summary["Exposure"] == 0, keys + ["Center Mean", "Center Variance"]
+            ]
+            .drop_duplicates(keys)
+            .rename(
+                columns={
+                    "Center Mean": "Reference Mean",
+                    "Center Variance": "Reference Variance",
+                }
+            )
         )
+        uptake = summary.merge(reference, on=keys, how="left")
 
-    def __calc_fractional_uptakes(self, group: pd.DataFrame) -> pd.DataFrame:
-        # self.controller.update_progress(
-        #     "Processing measurements:", "Calculating fractional uptakes"
-        # )
+        missing = uptake["Reference Mean"].isna()
+        if missing.any():
+            # no zero time point to measure uptake against, so leave them out
+            unreferenced = uptake.loc[missing, ["Sequence", "State"]].drop_duplicates()
+            progress.message(
+                "No zero time point, skipped",
+                ", ".join(
+                    unreferenced["Sequence"].astype(str)
+                    + " ("
+                    + unreferenced["State"].astype(str)
+                    + ")"
+                ),
+            )
+            uptake = uptake.loc[~missing]
 
-        reference_uptake = group.loc[group["Exposure"] == 0].iloc[0]["Center Mean"]
-        reference_variance = group.loc[group["Exposure"] == 0].iloc[0][
-            "Center Variance"
-        ]
+        uptake = uptake.sort_values(
+            keys + ["Exposure"], kind="stable", ignore_index=True
+        )
+        max_uptake = uptake.groupby(keys, observed=True)["MaxUptake"].transform("first")
 
-        uptake = group[
-            [
+        uptake["Abs. Uptake Mean"] = uptake["Center Mean"] - uptake["Reference Mean"]
+        uptake["Abs. Uptake Variance"] = (
+            uptake["Center Variance"] + uptake["Reference Variance"]
+        )
+        uptake["Rel. Uptake Mean"] = uptake["Abs. Uptake Mean"] / max_uptake
+        uptake["Rel. Uptake Variance"] = uptake["Abs. Uptake Variance"] / (
+            max_uptake**2
+        )
+
+        return uptake[
+            keys
+            + [
                 "Exposure",
                 "MaxUptake",
                 "Center Mean",
                 "Center Variance",
                 "Count",
+                "Abs. Uptake Mean",
+                "Abs. Uptake Variance",
+                "Rel. Uptake Mean",
+                "Rel. Uptake Variance",
             ]
         ]
-        uptake["Abs. Uptake Mean"] = group.apply(
-            lambda x: x["Center Mean"] - reference_uptake, axis=1
-        )
-        uptake["Abs. Uptake Variance"] = group.apply(
-            lambda x: x["Center Variance"] + reference_variance, axis=1
-        )
-        max_uptake = group.iloc[0]["MaxUptake"]
-        uptake["Rel. Uptake Mean"] = uptake.apply(
-            lambda x: x["Abs. Uptake Mean"] / max_uptake, axis=1
-        )
-        uptake["Rel. Uptake Variance"] = uptake.apply(
-            lambda x: x["Abs. Uptake Variance"] / (max_uptake**2), axis=1
-        )
-
-        uptake = uptake.set_index("Exposure")
-        return uptake
-
-    def get_absolute_uptake_data(self, protein, exposure, state=None):
-        filtered = self.position_data.loc[
-            (self.position_data["Exposure"] == exposure)
-            & (self.position_data["Protein"] == protein)
-        ]
-        if state:
-            # calc y-values
-            y_values = pd.Series(
-                filtered.apply(
-                    lambda x: x["Combined Mean"]
-                    - filtered.loc[
-                        (filtered["Position"] == x["Position"])
-                        & (filtered["State"] == state)
-                    ].iloc[0]["Combined Mean"],
-                    axis=1,
-                ),
-                name="Combined Mean",
-            )
-            # is it significant? get the passed state column
-            significance = pd.Series(
-                filtered.apply(lambda x: x[state], axis=1), name="p_value"
-            )
 
+    def get_states_protein_exposure_lists(self):
+        with self.lock:
+            results = self.current_results()
             return (
-                filtered[["Position", "State", "Combined Variance"]]
-                .join(y_values)
-                .join(significance)
+                results.state_list(),
+                results.exposure_list(),
+                results.protein_list(),
             )
-        else:
-            return filtered[["Position", "State", "Combined Variance", "Combined Mean"]]
-
-    def get_states_protein_exposure_lists(self):
-        return (
-            self.position_data["State"].unique().tolist(),
-            self.position_data["Exposure"].unique().tolist(),
-            self.position_data["Protein"].unique().tolist(),
-        )
 
     def get_dataset(self, protein, exposure, state="no_ref"):
+        with self.lock:
+            return self.paved_datasets.get(
+                (protein, exposure, state),
+                lambda: self.__make_dataset(protein, exposure, state),
+            )
+
+    def __make_dataset(self, protein, exposure, state):
+        results = self.current_results()
+        protein_results = results[protein]
         if state == "no_ref":
-            return self.paved_datasets[protein][exposure][state]
+            if "no_ref" not in self.min_max:
+                self.min_max["no_ref"] = results.no_ref_min_max()
+            return {
+                "data": protein_results.no_ref_data(exposure),
+                "min_max": self.min_max["no_ref"],
+            }
         else:
-            data = self.paved_datasets[protein][exposure][state]
-            data["min_max"] = self.paved_datasets[protein]["ref_min_max"]
-            return data
+            if protein not in self.min_max:
+                self.min_max[protein] = protein_results.ref_min_max()
+            return {
+                "data": protein_results.ref_data(exposure, state),
+                "min_max": self.min_max[protein],
+            }
@@ -0,0 +1,131 @@
+from queue import Empty
+import time
+
+
+class ProgressEvent:
+    """Progress of one stage of the pipeline.
+
+    done and total count units ("positions", "proteins", ...) of the stage,
+    for the whole run or for one protein; total is None when unknown.
+    elapsed is the number of seconds since the stage started. message is
+    free text for events that are not counts, like skipped peptides.
+    """
+
+    def __init__(
+        self,
+        stage,
+        done=0,
+        total=None,
+        unit="",
+        protein=None,
+        elapsed=0.0,
+        message="",
+    ):
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.unit = unit
+        self.protein = protein
+        self.elapsed = elapsed
+        self.message = message
+
+    def rate(self):
+        """Units done per second so far, or None before any are done."""
+        if self.done == 0 or self.elapsed <= 0:
+            return None
+        return self.done / self.elapsed
+
+    def eta(self):
+        """Seconds left at the rate so far, or None when it is not known."""
+        rate = self.rate()
+        if rate is None or self.total is None:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def describe(self):
+        parts = []
+        if self.protein is not None:
+            parts.append(str(self.protein))
+        if self.message:
+            parts.append(self.message)
+        if self.total is not None:
+            parts.append(f"{self.done}/{self.total} {self.unit}".rstrip())
+            rate = self.rate()
+            if rate is not None:
+                parts.append(f"{rate:.0f} {self.unit}/s".strip())
+            eta = self.eta()
+            if eta is not None and self.done < self.total:
+                parts.append(f"ETA {format_duration(eta)}")
+        return ", ".join(parts)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class ProgressReporter:
+    """Producer side of the progress channel.
+
+    Events are put on queue (a multiprocessing queue, or anything with put;
+    None drops them). Counts sent with update are throttled: only the latest
+    count of each stage and protein is kept and at most one batch of them is
+    put every interval seconds, so a stage can report every task it finishes
+    without flooding the queue or the window reading it. Starts, messages and
+    completed counts are sent straight away. close sends what is pending.
+    """
+
+    def __init__(self, queue=None, interval=0.25):
+        self.queue = queue
+        self.interval = interval
+        self.started = {}
+        self.pending = {}
+        self.last_put = 0.0
+
+    def start(self, stage, total=None, unit="", protein=None):
+        self.started[stage] = time.monotonic()
+        self.put(ProgressEvent(stage, 0, total, unit, protein))
+
+    def update(self, stage, done, total=None, unit="", protein=None):
+        event = ProgressEvent(stage, done, total, unit, protein, self.elapsed(stage))
+        self.pending[(stage, protein)] = event
+        if (total is not None and done >= total) or (
+            time.monotonic() - self.last_put >= self.interval
+        ):
+            self.flush()
+
+    def message(self, stage, message, protein=None):
+        self.put(
+            ProgressEvent(
+                stage, protein=protein, elapsed=self.elapsed(stage), message=message
+            )
+        )
+
+    def elapsed(self, stage):
+        started = self.started.setdefault(stage, time.monotonic())
+        return time.monotonic() - started
+
+    def flush(self):
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for event in pending:
+            self.put(event)
+
+    def put(self, event):
+        self.last_put = time.monotonic()
+        if self.queue is not None:
+            self.queue.put(event)
+
+    def close(self):
+        self.flush()
+
+
+def drain(queue):
+    """Return every event waiting on queue, without blocking."""
+    events = []
+    while True:
+        try:
+            events.append(queue.get_nowait())
+        except Empty:
+            return events
@@ -0,0 +1,110 @@
+import numpy as np
+from src.model.batch_stats import fdr_adjust
+
+
+class ProteinResult:
+    """Position statistics of one protein as dense arrays.
+
+    mean, variance and count are shaped [state, exposure, position], anova is
+    [exposure, position] and tukey holds the pairwise p-values as
+    [state, other state, exposure, position], tested at every position
+    whatever its ANOVA p-value. Positions start at first_position; positions,
+    states or exposures without data are NaN (count 0). Slicing out one
+    exposure or state returns views of these arrays, so switching datasets
+    does not copy or touch pandas.
+    """
+
+    def __init__(
+        self, states, exposures, first_position, mean, variance, count, anova, tukey
+    ):
+        self.states = list(states)
+        self.exposures = list(exposures)
+        self.first_position = first_position
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+        self.anova = anova
+        self.tukey = tukey
+        # Benjamini-Hochberg adjusted anova and tukey, made on first use
+        self.adjusted_anova = None
+        self.adjusted_tukey = None
+
+        self.position_array = np.arange(first_position, first_position + mean.shape[-1])
+        self.state_index = {state: i for i, state in enumerate(self.states)}
+        self.exposure_index = {exposure: i for i, exposure in enumerate(self.exposures)}
+
+    def positions(self):
+        return self.position_array
+
+    def no_ref_data(self, exposure):
+        e = self.exposure_index[exposure]
+        return {
+            "positions": self.positions(),
+            "states": self.states,
+            "mean": self.mean[:, e],
+            "variance": self.variance[:, e],
+        }
+
+    def ref_data(self, exposure, state):
+        e = self.exposure_index[exposure]
+        r = self.state_index[state]
+        adjusted_anova, adjusted_tukey = self.adjusted()
+        return {
+            "positions": self.positions(),
+            "states": self.states,
+            "mean": self.mean[:, e] - self.mean[r, e],
+            "variance": self.variance[:, e],
+            "anova_p": self.anova[e],
+            # p-value of the difference between each state and the reference
+            "p_value": self.tukey[:, r, e],
+            "adjusted_anova_p": adjusted_anova[e],
+            "adjusted_p_value": adjusted_tukey[:, r, e],
+        }
+
+    def adjusted(self):
+        """Return the anova and tukey p-values adjusted for the false
+        discovery rate across the positions of the protein."""
+        if self.adjusted_tukey is None:
+            self.adjusted_anova = fdr_adjust(self.anova)
+            self.adjusted_tukey = fdr_adjust(self.tukey)
+        return self.adjusted_anova, self.adjusted_tukey
+
+    def ref_min_max(self):
+        # extremes of (state - reference) + variance over every choice of
+        # reference state, exposure and position, always including 0
+        spread = self.mean + self.variance
+        upper = spread - np.fmin.reduce(self.mean, axis=0)
+        lower = spread - np.fmax.reduce(self.mean, axis=0)
+        return (
+            np.fmin.reduce(lower.ravel(), initial=0),
+            np.fmax.reduce(upper.ravel(), initial=0),
+        )
+
+
+class ResultStore:
+    """ProteinResult of every protein processed from a cluster file."""
+
+    def __init__(self, proteins):
+        self.proteins = proteins
+
+    def __getitem__(self, protein):
+        return self.proteins[protein]
+
+    def protein_list(self):
+        return list(self.proteins)
+
+    def state_list(self):
+        return sorted({s for result in self.proteins.values() for s in result.states})
+
+    def exposure_list(self):
+        return sorted(
+            {e for result in self.proteins.values() for e in result.exposures}
+        )
+
+    def no_ref_min_max(self):
+        # extremes of mean + variance over every protein, exposure and state
+        spreads = [result.mean + result.variance for result in self.proteins.values()]
+        return (
+            min(np.fmin.reduce(spread.ravel()) for spread in spreads),
+            max(np.fmax.reduce(spread.ravel()) for spread in spreads),
+        )
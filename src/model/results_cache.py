@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import numpy as np
+from src.model.disk_cache import DiskCache, default_cache_dir
+from src.model.input_cache import read_frame, write_frame
+from src.model.result_store import ProteinResult, ResultStore
+
+# position result arrays stored for every protein
+RESULT_ARRAYS = ["mean", "variance", "count", "anova", "tukey"]
+
+
+def results_key(content_key, pipeline_version, parameters):
+    """Key of the results of processing a file with the given content key,
+    pipeline version and parameters."""
+    description = json.dumps(
+        {
+            "input": content_key,
+            "pipeline": pipeline_version,
+            "parameters": parameters,
+        },
+        sort_keys=True,
+    )
+    return hashlib.blake2b(description.encode(), digest_size=16).hexdigest()
+
+
+def write_results(summary, results, directory):
+    os.makedirs(os.path.join(directory, "summary"))
+    write_frame(summary, os.path.join(directory, "summary"))
+    proteins = []
+    for i, (protein, result) in enumerate(results.proteins.items()):
+        proteins.append(
+            {
+                "name": protein,
+                "states": [str(state) for state in result.states],
+                "exposures": [float(exposure) for exposure in result.exposures],
+                "first_position": int(result.first_position),
+            }
+        )
+        for name in RESULT_ARRAYS:
+            np.save(os.path.join(directory, f"{i}.{name}.npy"), getattr(result, name))
+    with open(os.path.join(directory, "proteins.json"), "w") as file:
+        json.dump(proteins, file)
+
+
+def read_results(directory):
+    with open(os.path.join(directory, "proteins.json")) as file:
+        proteins = json.load(file)
+    results = {}
+    for i, protein in enumerate(proteins):
+        arrays = (
+            np.asarray(
+                np.load(os.path.join(directory, f"{i}.{name}.npy"), mmap_mode="r")
+            )
+            for name in RESULT_ARRAYS
+        )
+        results[protein["name"]] = ProteinResult(
+            protein["states"],
+            np.asarray(protein["exposures"]),
+            protein["first_position"],
+            *arrays,
+        )
+    return read_frame(os.path.join(directory, "summary")), ResultStore(results)
+
+
+class ResultsCache:
+    """Summary tables and position results of processed files, on disk.
+
+    Entries are keyed by results_key, so a file seen before with the same
+    pipeline version and parameters loads its results instead of being
+    processed again. Result arrays are memory-mapped read-only. Datasets are
+    views of the results and are not stored. Entries past max_bytes are
+    evicted least recently used first.
+    """
+
+    def __init__(self, directory=None, max_bytes=2**32):
+        if directory is None:
+            directory = os.path.join(default_cache_dir(), "results")
+        self.cache = DiskCache(directory, max_bytes)
+
+    def load(self, key):
+        """Return (summary_data, ResultStore) stored for key, or None."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        return read_results(entry)
+
+    def save(self, key, summary, results):
+        self.cache.put(
+            key, lambda directory: write_results(summary, results, directory)
+        )
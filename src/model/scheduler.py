@@ -0,0 +1,206 @@
+import queue
+from src.model.cancel_token import check_cancelled
+from src.model.executors import SerialExecutor
+from src.model.position_processor import (
+    PositionJob,
+    estimate_position_job,
+    process_position_window,
+)
+from src.model.studentized_range import get_studentized_range_table
+
+# the work is cut into this many tasks per worker so workers that finish
+# early can pick up what is left, and so a protein given priority during a
+# run waits for at most one task per worker
+TASKS_PER_WORKER = 8
+# proteins whose arrays exist at once; an open job holds 12 shared memory
+# blocks, each keeping two file descriptors open, and processes are commonly
+# limited to 1024 descriptors
+MAX_OPEN_JOBS = 16
+
+
+def process_proteins_to_positions(
+    protein_groups,
+    progress,
+    executor=None,
+    cancel=None,
+    priority=None,
+    on_result=None,
+):
+    """Run the position stage of every protein from one global task queue.
+
+    Every protein is turned into windows of positions which are packed into
+    tasks of about equal estimated cost, so large proteins are split across
+    workers and small ones share a task. The executor (serial when None)
+    selects the backend from the estimated cost of every protein. One task
+    per worker is kept in flight, and each time one finishes the next is
+    taken from the queue, costliest first, except that those of the protein
+    the callable priority returns (when given and not None) go before the
+    others. A protein's arrays are only created when its first task is sent,
+    and no more than MAX_OPEN_JOBS proteins have them at once while other
+    tasks are in flight. Each protein's ProteinResult is passed to
+    on_result(protein, result) as soon as its last window is done, and its
+    arrays are then freed.
+    Positions and proteins done are reported to progress as tasks finish.
+    Every task checks the CancelToken cancel (when given) before each
+    window; once it is cancelled the executor's outstanding tasks are
+    dropped and Cancelled is raised. Returns the ProteinResult of every
+    protein.
+    """
+    protein_groups = list(protein_groups)
+    estimates = [estimate_position_job(group) for _, group in protein_groups]
+    # at most MAX_OPEN_JOBS proteins have their arrays in shared memory at once
+    peak_nbytes = sum(
+        sorted((nbytes for _, nbytes in estimates), reverse=True)[:MAX_OPEN_JOBS]
+    )
+    executor = (executor or SerialExecutor()).select(
+        sum(cost for cost, _ in estimates), peak_nbytes
+    )
+
+    jobs = {}
+    try:
+        for protein, protein_group in protein_groups:
+            job = PositionJob(protein, protein_group, executor.shared)
+            jobs[protein] = job
+        # built here once rather than by every worker that needs them
+        max_states = max((len(job.states) for job in jobs.values()), default=1)
+        get_studentized_range_table().prepare(range(2, max_states + 1))
+
+        cancel_handles = None if cancel is None else cancel.handles()
+        tasks = TaskQueue(
+            schedule(jobs.values(), executor.workers * TASKS_PER_WORKER, MAX_OPEN_JOBS)
+        )
+        # (result, error) of every finished task, put by the executor
+        finished = queue.Queue()
+
+        n_positions = sum(job.n_positions for job in jobs.values())
+        remaining = {protein: job.n_positions for protein, job in jobs.items()}
+        results = {}
+        progress.start("Processing positions", n_positions, "positions")
+        progress.start("Processing proteins", len(jobs), "proteins")
+        done = 0
+        in_flight = 0
+        open_jobs = set()
+        while tasks or in_flight:
+            while tasks and in_flight < executor.workers:
+                windows = tasks.peek(None if priority is None else priority())
+                opening = {protein for protein, _, _ in windows} - open_jobs
+                if in_flight and len(open_jobs) + len(opening) > MAX_OPEN_JOBS:
+                    # wait for proteins in flight to finish and be closed
+                    break
+                tasks.remove(windows)
+                for protein in opening:
+                    jobs[protein].open()
+                    open_jobs.add(protein)
+                in_flight += 1
+                executor.submit(
+                    process_position_task,
+                    (cancel_handles, [jobs[w[0]].task(w) for w in windows]),
+                    lambda result, error: finished.put((result, error)),
+                )
+            windows, error = finished.get()
+            in_flight -= 1
+            if error is not None:
+                raise error
+            if cancel is not None:
+                cancel.check()
+            for protein, positions in windows:
+                done += positions
+                remaining[protein] -= positions
+                if remaining[protein] == 0:
+                    del remaining[protein]
+                    results[protein] = jobs[protein].result()
+                    jobs[protein].close()
+                    open_jobs.discard(protein)
+                    if on_result is not None:
+                        on_result(protein, results[protein])
+            progress.update("Processing positions", done, n_positions, "positions")
+            progress.update(
+                "Processing proteins",
+                len(jobs) - len(remaining),
+                len(jobs),
+                "proteins",
+            )
+
+        return {protein: results[protein] for protein in jobs}
+    except BaseException:
+        # stop the workers before their shared memory is freed below
+        executor.cancel()
+        raise
+    finally:
+        for job in jobs.values():
+            job.close()
+
+
+class TaskQueue:
+    """Tasks of a run not yet sent to the executor, in the order given.
+
+    peek returns the first task holding a window of the given protein, or
+    the first task when no protein is given or none of its tasks is left;
+    remove takes a task out once it is sent.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+
+    def __bool__(self):
+        return bool(self.tasks)
+
+    def peek(self, protein=None):
+        if protein is not None:
+            for task in self.tasks:
+                if any(window[0] == protein for window in task):
+                    return task
+        return self.tasks[0]
+
+    def remove(self, task):
+        for i, queued in enumerate(self.tasks):
+            if queued is task:
+                del self.tasks[i]
+                return
+
+
+def schedule(jobs, n_tasks, max_windows=None):
+    """Cut the jobs into about n_tasks lists of windows of similar cost,
+    costliest first, with at most max_windows windows each when given.
+
+    The windows of a protein are kept together so that few proteins are
+    part done, and so open, at any time.
+    """
+    jobs = sorted(jobs, key=lambda job: job.cost(), reverse=True)
+    total_cost = sum(job.cost() for job in jobs)
+    if total_cost == 0:
+        target = 0
+        windows = [(0, window) for job in jobs for window in job.windows(1)]
+    else:
+        target = total_cost / n_tasks
+        windows = []
+        for job in jobs:
+            # proteins costing more than a task are split into windows of
+            # about one task each; a window's cost is its share of positions
+            for window in job.windows(max(round(job.cost() / target), 1)):
+                first, last = window[-2:]
+                cost = job.cost() * (last - first + 1) / job.n_positions
+                windows.append((cost, window))
+
+    # windows cheaper than a task are packed together until they reach one
+    tasks = []
+    task, task_cost = [], 0
+    for cost, window in windows:
+        task.append(window)
+        task_cost += cost
+        if task_cost >= target or len(task) == max_windows:
+            tasks.append(task)
+            task, task_cost = [], 0
+    if task:
+        tasks.append(task)
+    return tasks
+
+
+def process_position_task(task):
+    cancel_handles, windows = task
+    done = []
+    for window in windows:
+        check_cancelled(cancel_handles)
+        # protein and number of positions of every window, for progress
+        done.append((window[1], process_position_window(window)))
+    return done
@@ -0,0 +1,88 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedArrays:
+    """Named numpy arrays that worker tasks can reach without pickling them.
+
+    With shared=True every array lives in its own multiprocessing shared
+    memory block and handles() describes the blocks by name, shape and
+    dtype, so a task only carries a few strings whatever the array sizes.
+    With shared=False the handles are the arrays themselves, for work that
+    stays in this process. close() frees the blocks; arrays handed out by
+    this object must not be used after that.
+    """
+
+    def __init__(self, shared=True):
+        self.shared = shared
+        self.arrays = {}
+        self.blocks = []
+
+    def create(self, name, shape, dtype=np.float64, fill=np.nan):
+        dtype = np.dtype(dtype)
+        if self.shared:
+            size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self.blocks.append(block)
+            array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        else:
+            array = np.empty(shape, dtype=dtype)
+        array.fill(fill)
+        self.arrays[name] = array
+        return array
+
+    def put(self, name, values):
+        values = np.asarray(values)
+        array = self.create(name, values.shape, values.dtype, fill=0)
+        array[...] = values
+        return array
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def handles(self):
+        if not self.shared:
+            return dict(self.arrays)
+        return {
+            name: (block.name, array.shape, array.dtype.str)
+            for (name, array), block in zip(self.arrays.items(), self.blocks)
+        }
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+class AttachedArrays:
+    """Arrays of a SharedArrays object, opened from its handles in a worker.
+
+    Use as a context manager so the worker's view of the blocks is closed
+    when the task is done; the blocks themselves stay with their owner.
+    """
+
+    def __init__(self, handles):
+        self.arrays = {}
+        self.blocks = []
+        for name, handle in handles.items():
+            if isinstance(handle, np.ndarray):
+                self.arrays[name] = handle
+                continue
+            block_name, shape, dtype = handle
+            block = shared_memory.SharedMemory(name=block_name)
+            self.blocks.append(block)
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.arrays = {}
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
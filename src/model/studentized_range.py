@@ -0,0 +1,175 @@
+import os
+import threading
+import zipfile
+import numpy as np
+from statsmodels.stats.libqsturng import psturng, qsturng
+from src.model.disk_cache import default_cache_dir
+
+# bump when the grids below change, so tables saved with other grids are not
+# loaded
+TABLE_VERSION = 2
+# upper tail p-values tabulated, over the .001 to .9 range psturng reports
+# and densest towards the small p-values significance is decided on
+P_GRID = np.geomspace(0.001, 0.9, 150)
+# degrees of freedom tabulated: every integer up to 30, then about evenly
+# spaced in 1 / df down to 1e38, which psturng treats as infinite
+DF_GRID = np.array(
+    list(range(2, 31))
+    + [32, 35, 40, 45, 50, 60, 70, 80, 100, 120, 150, 200, 300, 500, 1000, 1e38],
+    dtype=np.float64,
+)
+
+
+class StudentizedRangeTable:
+    """Interpolated psturng p-values, one table per number of groups k.
+
+    psturng inverts qsturng with a bounded minimisation on every call, which
+    makes it slow. A table instead holds qsturng at every point of a grid of
+    p-values (P_GRID) and degrees of freedom (DF_GRID). A p-value is found by
+    interpolating the q values of the two neighbouring degrees of freedom
+    linearly in 1 / df, then interpolating log p against q along the
+    resulting curve. Against psturng for k of 2, 3, 4, 6 and 10 and df from
+    2 to 5000 the largest difference found was 4.7e-4; outside the grid p is
+    clamped to .001 and .9 as psturng does. df below 2, where qsturng only
+    has a few p-values tabled, is evaluated with psturng point by point, as
+    is anything a table cannot give.
+
+    Building a table takes a second or two, so tables are saved to
+    cache_path and loaded by later runs and by the workers of this one. A
+    cache file that cannot be read is ignored and replaced by the next save,
+    and a save that fails leaves the tables in memory only.
+    """
+
+    def __init__(self, cache_path=None):
+        if cache_path is None:
+            cache_path = os.path.join(default_cache_dir(), "studentized_range.npz")
+        self.cache_path = cache_path
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def prepare(self, ks):
+        """Build and save the tables of every k in ks not yet available,
+        before tasks that need them are sent to workers."""
+        missing = [k for k in ks if self.table(k) is None]
+        for k in missing:
+            self.tables[int(k)] = self.build_table(k)
+        if missing:
+            self.save()
+
+    def p_values(self, q, k, df):
+        """Return psturng(q, k, df) for arrays of q, k and df.
+
+        Pairs psturng cannot evaluate, including those with df below 1, get a
+        p-value of 1.0.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        k = np.broadcast_to(np.asarray(k, dtype=np.float64), q.shape)
+        df = np.broadcast_to(np.asarray(df, dtype=np.float64), q.shape)
+        p_values = np.ones(q.shape)
+        pointwise = (df >= 1) & (df < DF_GRID[0])
+        for r in np.unique(k[df >= DF_GRID[0]]):
+            selected = (k == r) & (df >= DF_GRID[0])
+            table = self.table(r)
+            if table is None:
+                with self.lock:
+                    self.prepare([r])
+                table = self.table(r)
+            p_values[selected] = interpolate(table, q[selected], df[selected])
+            pointwise |= selected & np.isnan(p_values)
+        for i in np.flatnonzero(pointwise):
+            p_values.flat[i] = pointwise_p_value(q.flat[i], k.flat[i], df.flat[i])
+        return p_values
+
+    def table(self, k):
+        k = int(k)
+        if k not in self.tables:
+            # built by another process since this one loaded
+            self.load()
+        return self.tables.get(k)
+
+    def build_table(self, k):
+        q = np.full((len(DF_GRID), len(P_GRID)), np.nan)
+        for i, df in enumerate(DF_GRID):
+            for j, p in enumerate(P_GRID):
+                try:
+                    q[i, j] = qsturng(min(max(1 - p, 0.1), 0.999), k, df)
+                except (KeyError, ValueError):
+                    pass
+        return q
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path) as saved:
+                if "version" not in saved or saved["version"] != TABLE_VERSION:
+                    return
+                saved_tables = dict(zip(saved["ks"], saved["q"]))
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            # unreadable or truncated; rebuilt tables overwrite it
+            return
+        for k, table in saved_tables.items():
+            self.tables.setdefault(int(k), table)
+
+    def save(self):
+        # keep tables another process saved since this one was loaded
+        self.load()
+        ks = sorted(self.tables)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            np.savez(
+                tmp_path,
+                ks=np.array(ks),
+                q=np.stack([self.tables[k] for k in ks]),
+                version=TABLE_VERSION,
+            )
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # the tables are still used from memory, and rebuilt by the next run
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def interpolate(table, q, df):
+    """p-values of q at df from a table of qsturng over P_GRID x DF_GRID;
+    NaN where the table has a gap."""
+    inverse_grid = 1 / DF_GRID
+    p_values = np.empty(q.shape)
+    for v in np.unique(df):
+        selected = df == v
+        # neighbouring grid rows and the weight of the second, in 1 / df
+        upper = min(max(np.searchsorted(-inverse_grid, -1 / v), 1), len(DF_GRID) - 1)
+        weight = (inverse_grid[upper - 1] - 1 / v) / (
+            inverse_grid[upper - 1] - inverse_grid[upper]
+        )
+        weight = min(max(weight, 0.0), 1.0)
+        curve = (1 - weight) * table[upper - 1] + weight * table[upper]
+        if np.isnan(curve).any():
+            p_values[selected] = np.nan
+            continue
+        # q rises as p falls
+        p_values[selected] = np.exp(
+            np.interp(q[selected], curve[::-1], np.log(P_GRID[::-1]))
+        )
+    return p_values
+
+
+def pointwise_p_value(q, k, df):
+    try:
+        return float(np.squeeze(psturng(q, k, df)))
+    except (KeyError, ValueError):
+        return 1.0
+
+
+studentized_range_table = None
+
+
+def get_studentized_range_table():
+    global studentized_range_table
+    if studentized_range_table is None:
+        studentized_range_table = StudentizedRangeTable()
+    return studentized_range_table
@@ -0,0 +1,73 @@
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+import os
+
+
+def warm_worker(_):
+    # import the stats stack and load the saved studentized range tables once
+    # per worker so the first real task does not pay for it
+    from src.model.studentized_range import get_studentized_range_table
+
+    get_studentized_range_table()
+    return os.getpid()
+
+
+class WorkerPool:
+    """Long-lived process pool shared by every Model the app creates.
+
+    This is the process backend of the executors module. The pool is started
+    on first use (or by warm) and reused across proteins and across
+    processing runs until close is called. Tasks are submitted one at a
+    time and reach their arrays through shared memory. Workers are started
+    from a forkserver (spawned where there is none) rather than forked, as
+    the pool may be restarted while the caller runs other threads.
+    """
+
+    name = "process"
+    shared = True
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+        methods = mp.get_all_start_methods()
+        self.context = mp.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+
+    def start(self):
+        if self.pool is None:
+            # workers attach to shared memory blocks created here; they must
+            # share this process's resource tracker or each of them would
+            # report the blocks as leaked when it exits
+            resource_tracker.ensure_running()
+            self.pool = self.context.Pool(self.workers)
+        return self.pool
+
+    def select(self, cost, nbytes=0):
+        return self
+
+    def warm(self):
+        # runs in the background; callers do not wait for it
+        self.start().map_async(warm_worker, range(self.workers), chunksize=1)
+
+    def submit(self, func, task, done):
+        self.start().apply_async(
+            func,
+            (task,),
+            callback=lambda result: done(result, None),
+            error_callback=lambda error: done(None, error),
+        )
+
+    def cancel(self):
+        # terminating is the only way to take back tasks already sent to the
+        # workers; a new pool is started on next use
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -0,0 +1,56 @@
+import time
+import numpy as np
+import pandas as pd
+from src.model.process_cluster_data import Model
+
+# Compares the replicate summary stage as a groupby.apply of a per-group
+# function against the weighted sums over group codes Model uses, timing
+# Model's own summary method.
+# Run from the repository root: python -m src.spikes.benchmark_summary
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+SCALE = 100
+KEYS = ["Protein", "Sequence", "Start", "End", "Exposure", "State", "MaxUptake", "MHP"]
+
+
+def calc_summary_apply(group):
+    weights = group["Inten"]
+    average = np.average(group["Center MH+"], weights=weights)
+    variance = np.average((group["Center MH+"] - average) ** 2, weights=weights)
+    return pd.Series(
+        {
+            "Center Mean": average,
+            "Center Variance": variance,
+            "Count": int(len(group)),
+        }
+    )
+
+
+if __name__ == "__main__":
+    cluster = pd.read_csv(CSV_PATH)
+    cluster["Center MH+"] = cluster["Center"] * cluster["z"] - (
+        (cluster["z"] - 1) * 1.0078
+    )
+    # each copy is a separate protein so the number of groups scales too
+    data = pd.concat(
+        [cluster.assign(Protein=f"protein_{i}") for i in range(SCALE)],
+        ignore_index=True,
+    )
+    print(f"{len(data)} rows")
+
+    start = time.perf_counter()
+    expected = data.groupby(KEYS).apply(calc_summary_apply, include_groups=False)
+    apply_time = time.perf_counter() - start
+    print(f"groupby.apply: {apply_time:.2f} s")
+
+    # name-mangled private method of Model; the path is never read
+    calc_summary_data = Model(CSV_PATH)._Model__calc_summary_data
+    start = time.perf_counter()
+    result = calc_summary_data(data, KEYS)
+    bincount_time = time.perf_counter() - start
+    print(f"bincount:      {bincount_time:.2f} s")
+    print(f"speedup:       {apply_time / bincount_time:.0f}x")
+
+    expected = expected.reset_index()
+    for column in ["Center Mean", "Center Variance", "Count"]:
+        np.testing.assert_allclose(result[column], expected[column], rtol=1e-9)
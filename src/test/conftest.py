@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+import pytest
+
+import src.model.studentized_range as studentized_range
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+
+
+@pytest.fixture(scope="session")
+def session_cache_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("cache")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(session_cache_dir, monkeypatch):
+    # shared by every test so the studentized range tables are built once;
+    # inherited by worker and engine processes
+    monkeypatch.setenv("PYPAVED_CACHE_DIR", str(session_cache_dir))
+    monkeypatch.setattr(studentized_range, "studentized_range_table", None)
+    return session_cache_dir
+
+
+@pytest.fixture
+def write_cluster(tmp_path):
+    """Write the peptides of cluster_g ending before end to a file in
+    tmp_path and return its path."""
+
+    def write(end=40):
+        test_df = pd.read_csv(CSV_PATH)
+        path = tmp_path / "cluster.csv"
+        test_df.loc[test_df["End"] < end].to_csv(path, index=False)
+        return path
+
+    return write
+
+
+@pytest.fixture
+def cluster_path(write_cluster):
+    return write_cluster()
+
+
+@pytest.fixture
+def shared_memory_blocks():
+    """Return a function listing the shared memory blocks of the system."""
+
+    def blocks():
+        if not os.path.isdir("/dev/shm"):
+            return set()
+        # the semaphores of a terminated pool started without fork are only
+        # removed once it is garbage collected
+        return {name for name in os.listdir("/dev/shm") if not name.startswith("sem.")}
+
+    return blocks
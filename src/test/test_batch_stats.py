@@ -0,0 +1,247 @@
+import math
+
+import numpy as np
+import pandas as pd
+from scipy.stats import f
+from statsmodels.stats.libqsturng import psturng
+
+from src.model.batch_stats import batch_anova, batch_tukey, fdr_adjust
+from src.model.studentized_range import StudentizedRangeTable
+
+STATES = ["control", "state_1", "state_2", "state_3"]
+
+
+# calc_anova_from_means and calc_tukey are the per-position pandas
+# calculations batch_anova and batch_tukey replaced, kept as references
+def calc_anova_from_means(means):
+    # here means contains state, combined variance, combined mean and combined count
+
+    grand_mean = (means["Combined Mean"] * means["Combined Count"]).sum() / means[
+        "Combined Count"
+    ].sum()
+
+    ss_between = (
+        means["Combined Count"] * ((means["Combined Mean"] - grand_mean) ** 2)
+    ).sum()
+    df_between = means.shape[0] - 1
+    ms_between = ss_between / df_between if df_between != 0 else 0
+
+    ss_within = ((means["Combined Count"] - 1) * means["Combined Variance"]).sum()
+    df_within = means["Combined Count"].sum() - means.shape[0]
+    ms_within = ss_within / df_within if df_within != 0 else 0
+
+    f_stat = ms_between / ms_within if ms_within != 0 else 0
+
+    p_value = 1 - f.cdf(f_stat, df_between, df_within)
+
+    means["ANOVA"] = p_value
+
+    means["ms_within"] = ms_within
+    means = means.set_index("State")
+    return means
+
+
+def calc_tukey(group):
+    tukeys = pd.DataFrame()
+    tukeys["State"] = group["State"]
+
+    for state in tukeys["State"]:
+        tukeys[state] = [1.0] * len(tukeys["State"])
+
+    anova_p = group.iloc[0]["ANOVA"]
+    p_threshold = 0.05
+    if anova_p < p_threshold:
+        ms_within = group.iloc[0]["ms_within"]
+        k = len(group.index)
+        n = group["Combined Count"].sum()
+
+        for outer_index, outer_row in group.iterrows():
+            for inner_index, inner_row in group.iterrows():
+                if outer_index != inner_index:
+                    se = math.sqrt(
+                        (ms_within / 2)
+                        * (
+                            1 / outer_row["Combined Count"]
+                            + 1 / inner_row["Combined Count"]
+                        )
+                    )
+                    mean_diff = abs(
+                        outer_row["Combined Mean"] - inner_row["Combined Mean"]
+                    )
+                    q = mean_diff / se if se != 0 else 0
+
+                    try:
+                        p_tukey = psturng(q, k, n - k)
+                        if isinstance(p_tukey, np.ndarray):
+                            p_tukey = p_tukey[0]
+                        tukeys.loc[outer_index, inner_row["State"]] = p_tukey
+                    except KeyError:
+                        continue
+
+    tukeys = tukeys.set_index("State")
+
+    return tukeys
+
+
+def make_means(rng, n_groups):
+    return (
+        rng.random((len(STATES), n_groups)),
+        rng.random((len(STATES), n_groups)) / 100,
+        rng.integers(1, 12, (len(STATES), n_groups)).astype(float),
+    )
+
+
+def means_frame(mean, variance, count, group):
+    present = count[:, group] > 0
+    return pd.DataFrame(
+        {
+            "State": np.array(STATES)[present],
+            "Combined Mean": mean[present, group],
+            "Combined Variance": variance[present, group],
+            "Combined Count": count[present, group],
+        }
+    )
+
+
+def test_batch_anova_matches_calc_anova_for_every_group():
+    rng = np.random.default_rng(1)
+    mean, variance, count = make_means(rng, 50)
+    # drop some states from some groups
+    count[rng.random(count.shape) < 0.2] = 0
+
+    _, p_value, ms_within = batch_anova(mean, variance, count)
+
+    for group in range(mean.shape[1]):
+        expected = calc_anova_from_means(means_frame(mean, variance, count, group))
+        np.testing.assert_allclose(
+            p_value[group], expected["ANOVA"].iloc[0], rtol=1e-8, atol=1e-12
+        )
+        np.testing.assert_allclose(ms_within[group], expected["ms_within"].iloc[0])
+
+
+def test_batch_anova_handles_zero_degrees_of_freedom():
+    rng = np.random.default_rng(2)
+    mean, variance, count = make_means(rng, 3)
+    # single state -> df_between == 0
+    count[1:, 0] = 0
+    # one replicate per state -> df_within == 0
+    count[:, 1] = 1
+    # no variance -> ms_within == 0
+    variance[:, 2] = 0
+    count[:, 2] = 3
+
+    f_stat, p_value, ms_within = batch_anova(mean, variance, count)
+
+    assert f_stat[0] == 0 and np.isnan(p_value[0])
+    assert ms_within[1] == 0 and f_stat[1] == 0 and np.isnan(p_value[1])
+    assert ms_within[2] == 0 and f_stat[2] == 0 and p_value[2] == 1
+    for group in range(3):
+        expected = calc_anova_from_means(means_frame(mean, variance, count, group))
+        np.testing.assert_equal(p_value[group], expected["ANOVA"].iloc[0])
+
+
+def test_batch_tukey_matches_calc_tukey_for_every_group(tmp_path):
+    rng = np.random.default_rng(3)
+    mean, variance, count = make_means(rng, 40)
+    # spread the means so that most groups are significant
+    mean = mean + np.arange(len(STATES))[:, None] * 0.05
+    count[rng.random(count.shape) < 0.1] = 0
+
+    _, p_value, ms_within = batch_anova(mean, variance, count)
+    table = StudentizedRangeTable(cache_path=str(tmp_path / "table.npz"))
+    pairwise = batch_tukey(mean, count, ms_within, p_value, studentized_range=table)
+
+    assert (p_value < 0.05).any() and (p_value >= 0.05).any()
+    for group in range(mean.shape[1]):
+        expected = calc_tukey(
+            calc_anova_from_means(
+                means_frame(mean, variance, count, group)
+            ).reset_index()
+        )
+        for state, row in expected.iterrows():
+            outer = STATES.index(state)
+            for other in STATES:
+                inner = STATES.index(other)
+                if other in row:
+                    np.testing.assert_allclose(
+                        pairwise[outer, inner, group], row[other], atol=1e-3
+                    )
+                else:
+                    assert np.isnan(pairwise[outer, inner, group])
+
+
+def test_studentized_range_table_is_saved_and_reloaded(tmp_path):
+    cache_path = str(tmp_path / "table.npz")
+    q = np.linspace(0, 8, 200)
+    k = np.full(q.shape, 4)
+    df = np.full(q.shape, 20)
+
+    table = StudentizedRangeTable(cache_path=cache_path)
+    p_values = table.p_values(q, k, df)
+    reloaded = StudentizedRangeTable(cache_path=cache_path)
+
+    assert 4 in reloaded.tables
+    np.testing.assert_array_equal(reloaded.p_values(q, k, df), p_values)
+
+
+def test_studentized_range_table_rebuilds_a_corrupt_cache_file(tmp_path):
+    cache_path = str(tmp_path / "table.npz")
+    q = np.linspace(0, 8, 200)
+    k = np.full(q.shape, 4)
+    df = np.full(q.shape, 20)
+    p_values = StudentizedRangeTable(cache_path=cache_path).p_values(q, k, df)
+    with open(cache_path, "r+b") as cache_file:
+        cache_file.truncate(cache_file.seek(0, 2) // 2)
+
+    table = StudentizedRangeTable(cache_path=cache_path)
+
+    assert table.tables == {}
+    np.testing.assert_array_equal(table.p_values(q, k, df), p_values)
+    assert 4 in StudentizedRangeTable(cache_path=cache_path).tables
+
+
+def test_studentized_range_table_is_used_when_it_cannot_be_saved(tmp_path):
+    # its directory is a file
+    (tmp_path / "cache").write_text("")
+    table = StudentizedRangeTable(cache_path=str(tmp_path / "cache" / "table.npz"))
+    q = np.linspace(0, 8, 200)
+
+    p_values = table.p_values(q, np.full(q.shape, 4), np.full(q.shape, 20))
+
+    assert 4 in table.tables
+    assert ((p_values > 0) & (p_values <= 1)).all()
+    assert [path.name for path in tmp_path.iterdir()] == ["cache"]
+
+
+def test_studentized_range_table_matches_psturng(tmp_path):
+    table = StudentizedRangeTable(cache_path=str(tmp_path / "table.npz"))
+    q = np.linspace(0.1, 9, 30)
+    for k in [2, 5]:
+        table.prepare([k])
+        # on and between the rows of DF_GRID
+        for df in [2, 9, 33, 130, 600, 3000]:
+            expected = [float(np.squeeze(psturng(x, k, df))) for x in q]
+            np.testing.assert_allclose(
+                table.p_values(q, np.full(q.shape, k), np.full(q.shape, df)),
+                expected,
+                atol=5e-4,
+            )
+
+
+def test_studentized_range_table_evaluates_small_df_with_psturng(tmp_path):
+    table = StudentizedRangeTable(cache_path=str(tmp_path / "table.npz"))
+    p_values = table.p_values(np.array([15.0, 15.0]), np.array([2, 2]), [1, 0])
+    np.testing.assert_allclose(p_values, [np.squeeze(psturng(15.0, 2, 1)), 1.0])
+
+
+def test_fdr_adjust_matches_benjamini_hochberg_and_skips_nan():
+    p_values = np.array([[0.01, 0.04, np.nan, 0.03, 0.2], [0.5, 0.5, 0.5, 0.5, 0.5]])
+
+    adjusted = fdr_adjust(p_values)
+
+    # m = 4 tests in the first row: 0.01*4/1, then min(0.04*4/3, 0.03*4/2, ...)
+    np.testing.assert_allclose(
+        adjusted[0, [0, 1, 3, 4]], [0.04, 0.0533333, 0.0533333, 0.2], rtol=1e-5
+    )
+    assert np.isnan(adjusted[0, 2])
+    np.testing.assert_allclose(adjusted[1], 0.5)
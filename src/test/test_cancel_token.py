@@ -0,0 +1,60 @@
+import pytest
+
+from src.model.cancel_token import CancelToken, Cancelled
+from src.model.process_cluster_data import Model
+from src.model.progress import ProgressReporter
+from src.model.worker_pool import WorkerPool
+
+
+class CancellingQueue:
+    """Cancels the token once the first position task has finished."""
+
+    def __init__(self, token):
+        self.token = token
+
+    def put(self, event):
+        if event.stage == "Processing positions" and event.done > 0:
+            self.token.cancel()
+
+
+def test_cancelled_token_stops_the_run_before_any_stage(cluster_path):
+    model = Model(cluster_path)
+    token = CancelToken()
+    token.cancel()
+    try:
+        with pytest.raises(Cancelled):
+            model.start_process(cancel=token)
+    finally:
+        token.close()
+
+    assert model.data is None
+    assert model.results is None
+
+
+def test_cancelling_position_tasks_frees_workers_and_shared_memory(
+    write_cluster, shared_memory_blocks
+):
+    cluster_path = write_cluster(80)
+    pool = WorkerPool(workers=2)
+    blocks = shared_memory_blocks()
+    try:
+        model = Model(cluster_path, executor=pool)
+        token = CancelToken()
+        try:
+            with pytest.raises(Cancelled):
+                model.start_process(
+                    ProgressReporter(CancellingQueue(token), interval=0), token
+                )
+        finally:
+            token.close()
+        assert model.results is None
+        assert shared_memory_blocks() == blocks
+
+        # stages before the positions stay memoized and the pool starts
+        # again on next use
+        assert "uptakes" in model.pipeline.memo
+        assert "positions" not in model.pipeline.memo
+        model.start_process()
+        assert model.results["protein_1"].mean.shape[-1] > 0
+    finally:
+        pool.close()
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from src.model.cluster_reader import CLUSTER_SCHEMA, read_cluster
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+
+
+def test_only_pipeline_columns_are_read_with_schema_dtypes():
+    data = read_cluster(CSV_PATH)
+
+    assert list(data.columns) == list(CLUSTER_SCHEMA)
+    for column, dtype in CLUSTER_SCHEMA.items():
+        assert data[column].dtype == dtype
+    raw = pd.read_csv(CSV_PATH)
+    assert len(data) == len(raw)
+    assert data["Protein"].astype(str).equals(raw["Protein"])
+    assert data["Center"].equals(raw["Center"])
+
+
+def test_chunked_read_matches_whole_read(tmp_path):
+    raw = pd.read_csv(CSV_PATH)
+    # states in separate chunks so every chunk infers different categories
+    raw = raw.loc[raw["End"] < 60].sort_values("State", kind="stable")
+    path = tmp_path / "cluster.csv"
+    raw.to_csv(path, index=False)
+
+    whole = read_cluster(path, engine="c")
+    chunked = read_cluster(path, chunksize=100)
+
+    pd.testing.assert_frame_equal(chunked, whole)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from src.model.coverage_index import CoverageIndex
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+
+
+def coverage_of(test_df):
+    return CoverageIndex(test_df["Start"].to_numpy(), test_df["End"].to_numpy())
+
+
+def covering_rows(coverage, position):
+    offset = position - coverage.first_position
+    return coverage.indices[coverage.indptr[offset] : coverage.indptr[offset + 1]]
+
+
+def test_rows_match_boolean_mask_for_every_position():
+    test_df = pd.read_csv(CSV_PATH)
+    test_df = test_df.loc[test_df["End"] < 70].reset_index(drop=True)
+    coverage = coverage_of(test_df)
+
+    for i in coverage.positions():
+        expected = np.flatnonzero((test_df["Start"] < i) & (test_df["End"] >= i))
+        np.testing.assert_array_equal(covering_rows(coverage, i), expected)
+
+
+def test_counts_returns_rows_per_position():
+    coverage = CoverageIndex(np.array([3, 5]), np.array([8, 12]))
+
+    np.testing.assert_array_equal(coverage.counts(), [0, 1, 1, 2, 2, 2, 1, 1, 1, 1])
+
+
+def test_segments_split_protein_where_covering_rows_change():
+    test_df = pd.read_csv(CSV_PATH)
+    test_df = test_df.loc[test_df["End"] < 70].reset_index(drop=True)
+    coverage = coverage_of(test_df)
+
+    segment_starts, segment_lengths = coverage.segments()
+
+    assert segment_lengths.sum() == len(coverage.positions())
+    for start, length in zip(segment_starts, segment_lengths):
+        for i in range(start + 1, start + length):
+            np.testing.assert_array_equal(
+                covering_rows(coverage, i), covering_rows(coverage, start)
+            )
+    for start in segment_starts[1:]:
+        assert not np.array_equal(
+            covering_rows(coverage, start), covering_rows(coverage, start - 1)
+        )
+
+
+def test_window_keeps_rows_and_segments_of_its_positions():
+    test_df = pd.read_csv(CSV_PATH)
+    test_df = test_df.loc[test_df["End"] < 70].reset_index(drop=True)
+    coverage = coverage_of(test_df)
+    window = CoverageIndex(test_df["Start"], test_df["End"], 20, 40)
+
+    assert list(window.positions()) == list(range(20, 41))
+    for i in window.positions():
+        np.testing.assert_array_equal(
+            covering_rows(window, i), covering_rows(coverage, i)
+        )
+
+    segment_starts, _ = coverage.segments()
+    window_starts, window_lengths = window.segments()
+    inside = segment_starts[(segment_starts > 20) & (segment_starts <= 40)]
+    np.testing.assert_array_equal(window_starts, np.append(20, inside))
+    assert window_lengths.sum() == 21
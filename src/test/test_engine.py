@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.model.engine import Engine
+from src.model.engine_client import EngineClient, EngineError
+from src.model.process_cluster_data import Model
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # a cache of its own, or a file processed by another test would be
+    # answered from the results cache without a run
+    monkeypatch.setenv("PYPAVED_CACHE_DIR", str(tmp_path / "cache"))
+    engine = EngineClient()
+    yield engine
+    engine.shutdown()
+
+
+def finish(engine, request):
+    """Final response to a process request and its partial responses."""
+    partial = []
+    while True:
+        response = engine.poll(request)
+        if response is None:
+            time.sleep(0.01)
+        elif response[0] == "partial":
+            partial.append(response[1])
+        else:
+            return response, partial
+
+
+def test_engine_processes_a_file_and_serves_its_datasets(
+    engine, cluster_path, shared_memory_blocks
+):
+    request = engine.process(cluster_path)
+    (status, (states, exposures, proteins)), partial = finish(engine, request)
+    assert status == "ok"
+    # one partial response for the only protein
+    assert partial == [(states, exposures, proteins, proteins)]
+
+    model = Model(cluster_path)
+    model.start_process()
+    assert (states, exposures, proteins) == (
+        [str(state) for state in model.results.state_list()],
+        [float(exposure) for exposure in model.results.exposure_list()],
+        model.results.protein_list(),
+    )
+
+    blocks = shared_memory_blocks()
+    dataset = engine.get_dataset("protein_1", 30.0, "control")
+    expected = model.get_dataset("protein_1", 30.0, "control")
+    assert dataset["min_max"] == pytest.approx(expected["min_max"])
+    assert dataset["data"]["states"] == expected["data"]["states"]
+    for name in ["positions", "mean", "variance", "anova_p", "p_value"]:
+        np.testing.assert_array_equal(dataset["data"][name], expected["data"][name])
+    # the engine frees the blocks of a dataset at the next request
+    engine.get_dataset("protein_1", 30.0)
+    engine.shutdown()
+    assert shared_memory_blocks() <= blocks
+
+    # a new engine serves the results saved by the first without a run
+    restarted = EngineClient()
+    try:
+        assert finish(restarted, restarted.process(cluster_path)) == (
+            ("ok", (states, exposures, proteins)),
+            [],
+        )
+    finally:
+        restarted.shutdown()
+
+
+def test_engine_reports_failed_requests(engine, tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("Protein\n")
+    (status, error), _ = finish(engine, engine.process(str(path)))
+    assert status == "error"
+    with pytest.raises(EngineError):
+        engine.get_dataset("protein_1", 30.0)
+
+
+def test_engine_cancels_a_run(engine, cluster_path):
+    request = engine.process(cluster_path)
+    engine.cancel()
+    assert finish(engine, request) == (("cancelled", None), [])
+    # the engine takes the next file straight away
+    (status, _), _ = finish(engine, engine.process(cluster_path))
+    assert status == "ok"
+
+
+def test_engine_resumes_a_cancelled_run_and_releases_a_finished_one(
+    tmp_path, monkeypatch, cluster_path
+):
+    monkeypatch.setenv("PYPAVED_CACHE_DIR", str(tmp_path / "cache"))
+    engine = Engine(queue.Queue(), queue.Queue())
+    try:
+        engine.process(0, str(cluster_path))
+        engine.cancel_token.cancel()
+        engine.thread.join()
+        # a file changed since its run was cancelled gets a new model
+        cancelled = engine.cancelled[0]
+        os.utime(cluster_path, ns=(0, 0))
+        engine.process(1, str(cluster_path))
+        assert engine.running is not cancelled
+        cancelled = engine.running
+        engine.cancel_token.cancel()
+        engine.thread.join()
+        # the same, unchanged file resumes the cancelled model
+        engine.process(2, str(cluster_path))
+        assert engine.running is cancelled
+        engine.thread.join()
+        assert engine.model is cancelled
+        assert cancelled.pipeline.memo == {}
+        assert cancelled.data is None
+        statuses = []
+        while not engine.responses.empty():
+            statuses.append(engine.responses.get()[1])
+        assert [s for s in statuses if s != "partial"] == [
+            "cancelled",
+            "cancelled",
+            "ok",
+        ]
+    finally:
+        engine.shutdown()
+
+
+def test_responses_are_not_lost_to_requests_from_another_thread(engine, cluster_path):
+    request = engine.process(cluster_path)
+    done = threading.Event()
+
+    def fetch():
+        # datasets requested while the run publishes, as prefetch does
+        while not done.is_set():
+            try:
+                engine.get_dataset("protein_1", 30.0)
+            except EngineError:
+                pass
+
+    thread = threading.Thread(target=fetch)
+    thread.start()
+    try:
+        (status, _), partial = finish(engine, request)
+    finally:
+        done.set()
+        thread.join()
+    assert status == "ok"
+    assert len(partial) == 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import os
+
+from src.model.executors import AutoExecutor, make_executor, shared_memory_limit
+from src.model.process_cluster_data import Model
+
+
+def test_auto_executor_selects_backend_by_workload():
+    executor = AutoExecutor(
+        workers=4, memory_limit=1000, thread_cost=10, process_cost=100
+    )
+
+    assert executor.select(5).name == "serial"
+    assert executor.select(50).name == "thread"
+    assert executor.select(500, nbytes=500).name == "process"
+    assert executor.select(500, nbytes=5000).name == "thread"
+    assert AutoExecutor(workers=1, thread_cost=10).select(500).name == "serial"
+
+
+def test_shared_memory_limit_is_a_share_of_free_shared_memory():
+    limit = shared_memory_limit()
+    if not os.path.isdir("/dev/shm"):
+        assert limit is None
+        return
+    stat = os.statvfs("/dev/shm")
+    assert 0 < limit <= stat.f_blocks * stat.f_frsize
+
+
+def test_unknown_executor_mode_raises():
+    with pytest.raises(ValueError):
+        make_executor("cluster")
+
+
+def test_thread_executor_gives_same_results_as_serial(write_cluster):
+    path = write_cluster(60)
+
+    serial = Model(path)
+    serial.start_process()
+    executor = make_executor("thread", workers=2)
+    try:
+        threaded = Model(path, executor=executor)
+        threaded.start_process()
+    finally:
+        executor.close()
+
+    expected = serial.results["protein_1"]
+    result = threaded.results["protein_1"]
+    np.testing.assert_array_equal(result.mean, expected.mean)
+    np.testing.assert_array_equal(result.tukey, expected.tukey)
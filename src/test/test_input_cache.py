@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+
+from src.model.disk_cache import DiskCache
+from src.model.input_cache import InputCache
+from src.model.cluster_reader import read_cluster
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+
+
+def test_second_load_maps_the_cached_columns(tmp_path):
+    cache = InputCache(tmp_path / "inputs")
+
+    first = cache.load(CSV_PATH)
+    second = InputCache(tmp_path / "inputs").load(CSV_PATH)
+
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(second, read_cluster(CSV_PATH))
+    # columns are read-only maps of the cache files, not parsed copies
+    assert not second["Center"].to_numpy().flags.writeable
+
+
+def test_entries_are_keyed_by_content(tmp_path):
+    cache = InputCache(tmp_path / "inputs")
+    test_df = pd.read_csv(CSV_PATH)
+    path = tmp_path / "cluster.csv"
+    test_df.to_csv(path, index=False)
+    copy_path = tmp_path / "copy.csv"
+    test_df.to_csv(copy_path, index=False)
+
+    assert cache.key(path) == cache.key(copy_path)
+    test_df.loc[test_df["End"] < 40].to_csv(path, index=False)
+    assert cache.key(path) != cache.key(copy_path)
+    assert len(cache.load(path)) == (test_df["End"] < 40).sum()
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=2500)
+
+    def write(directory):
+        with open(os.path.join(directory, "data"), "wb") as file:
+            file.write(bytes(1000))
+
+    cache.put("a", write)
+    cache.put("b", write)
+    os.utime(cache.path("a"), (0, 0))
+    cache.get("a")
+    os.utime(cache.path("b"), (0, 0))
+    cache.put("c", write)
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+from src.model.lru_cache import LRUCache
+
+
+def test_values_are_built_once_and_reused():
+    cache = LRUCache(max_entries=2)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return "value"
+
+    assert cache.get("a", build) == "value"
+    assert cache.get("a", build) == "value"
+    assert len(calls) == 1
+
+
+def test_least_recently_used_entry_is_evicted_by_count():
+    cache = LRUCache(max_entries=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)
+    cache.get("c", lambda: 3)
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+
+
+def test_entries_are_evicted_by_owned_bytes():
+    store = np.zeros(1000)
+    cache = LRUCache(max_bytes=4000)
+    cache.get("view", lambda: {"data": store[:500]})
+    cache.get("a", lambda: {"data": np.zeros(200)})
+    cache.get("b", lambda: {"data": np.zeros(200)})
+
+    assert len(cache) == 3 and cache.nbytes == 3200
+    cache.get("c", lambda: {"data": np.zeros(200)})
+
+    assert "view" not in cache and "a" not in cache
+    assert "b" in cache and "c" in cache
+    assert cache.nbytes == 3200
+
+
+def test_a_slow_build_does_not_hold_up_other_keys():
+    cache = LRUCache(max_entries=4)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    thread = threading.Thread(target=cache.get, args=("slow", slow_build))
+    thread.start()
+    started.wait(5)
+    assert cache.get("fast", lambda: "fast") == "fast"
+    assert "slow" not in cache
+    release.set()
+    thread.join()
+
+    # the value stored first is kept when a key is built twice
+    assert cache.get("slow", lambda: "again") == "slow"
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.model.process_cluster_data import Model
+from src.model.progress import ProgressReporter
+from src.model.worker_pool import WorkerPool
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.events = []
+
+    def put(self, event):
+        self.events.append(event)
+
+
+def test_fractional_uptakes_are_relative_to_zero_time_point(cluster_path):
+    model = Model(cluster_path)
+    model.start_process()
+    summary = model.summary_data
+
+    zero = summary.loc[summary["Exposure"] == 0]
+    assert (zero["Abs. Uptake Mean"] == 0).all()
+    np.testing.assert_allclose(
+        zero["Abs. Uptake Variance"], 2 * zero["Center Variance"]
+    )
+
+    row = summary.loc[summary["Exposure"] > 0].iloc[0]
+    reference = zero.loc[
+        (zero["Sequence"] == row["Sequence"]) & (zero["State"] == row["State"])
+    ].iloc[0]
+    assert row["Rel. Uptake Mean"] == pytest.approx(
+        (row["Center Mean"] - reference["Center Mean"]) / row["MaxUptake"]
+    )
+    assert row["Rel. Uptake Variance"] == pytest.approx(
+        (row["Center Variance"] + reference["Center Variance"]) / row["MaxUptake"] ** 2
+    )
+
+
+def test_summary_matches_weighted_averages_of_each_group(cluster_path):
+    rng = np.random.default_rng(0)
+    frames = []
+    # the second group has large masses with a tiny spread, where summing
+    # weights * masses**2 would lose the variance to rounding
+    for sequence, mass, spread, rows in [
+        ("PEPTIDE", 800.0, 0.05, 4),
+        ("LARGEPEPTIDE", 5432.1, 1e-4, 5),
+        ("ONCE", 1200.0, 0.0, 1),
+    ]:
+        frames.append(
+            pd.DataFrame(
+                {
+                    "Sequence": sequence,
+                    "State": "control",
+                    "Inten": rng.uniform(1e3, 1e6, rows),
+                    "Center MH+": mass + rng.normal(0, spread, rows),
+                }
+            )
+        )
+    data = pd.concat(frames, ignore_index=True)
+
+    summary = Model(cluster_path)._Model__calc_summary_data(data, ["Sequence", "State"])
+
+    for _, row in summary.iterrows():
+        group = data.loc[data["Sequence"] == row["Sequence"]]
+        mean = np.average(group["Center MH+"], weights=group["Inten"])
+        variance = np.average((group["Center MH+"] - mean) ** 2, weights=group["Inten"])
+        assert row["Center Mean"] == pytest.approx(mean, rel=1e-12)
+        assert row["Center Variance"] == pytest.approx(variance, rel=1e-6, abs=1e-15)
+        assert row["Count"] == len(group)
+    large = summary.loc[summary["Sequence"] == "LARGEPEPTIDE"].iloc[0]
+    assert 1e-9 < large["Center Variance"] < 1e-7
+
+
+def test_peptides_without_zero_time_point_are_reported_and_skipped(
+    cluster_path,
+):
+    test_df = pd.read_csv(cluster_path)
+    sequence = test_df["Sequence"].iloc[0]
+    test_df = test_df.loc[
+        ~((test_df["Sequence"] == sequence) & (test_df["Exposure"] == 0))
+    ]
+    test_df.to_csv(cluster_path, index=False)
+
+    model = Model(cluster_path)
+    queue = RecordingQueue()
+    model.start_process(ProgressReporter(queue))
+
+    assert sequence not in model.summary_data["Sequence"].values
+    skipped = [e for e in queue.events if e.stage == "No zero time point, skipped"]
+    assert len(skipped) == 1
+    assert sequence in skipped[0].message
+
+
+def test_reference_dataset_is_relative_to_reference_state(cluster_path):
+    model = Model(cluster_path)
+    model.start_process()
+    results = model.results["protein_1"]
+    control = results.states.index("control")
+    exposure = results.exposures.index(30)
+
+    dataset = model.get_dataset("protein_1", 30, "control")
+    data = dataset["data"]
+
+    assert (data["mean"][control][~np.isnan(data["mean"][control])] == 0).all()
+    np.testing.assert_array_equal(
+        data["mean"], results.mean[:, exposure] - results.mean[control, exposure]
+    )
+    np.testing.assert_array_equal(data["p_value"], results.tukey[:, control, exposure])
+    assert dataset["min_max"] == results.ref_min_max()
+
+
+def test_datasets_are_views_of_the_result_arrays(cluster_path):
+    model = Model(cluster_path)
+    model.start_process()
+    results = model.results["protein_1"]
+
+    no_ref = model.get_dataset("protein_1", 30)["data"]
+    ref = model.get_dataset("protein_1", 30, "control")["data"]
+
+    assert np.shares_memory(no_ref["mean"], results.mean)
+    assert np.shares_memory(no_ref["variance"], results.variance)
+    assert np.shares_memory(ref["p_value"], results.tukey)
+
+
+def test_worker_pool_gives_same_results_as_in_process(cluster_path):
+    serial = Model(cluster_path)
+    serial.start_process()
+
+    pool = WorkerPool(workers=2)
+    try:
+        for _ in range(2):
+            pooled = Model(cluster_path, executor=pool)
+            pooled.start_process()
+    finally:
+        pool.close()
+
+    expected = serial.results["protein_1"]
+    result = pooled.results["protein_1"]
+    np.testing.assert_array_equal(result.anova, expected.anova)
+    np.testing.assert_array_equal(result.tukey, expected.tukey)
@@ -0,0 +1,46 @@
+import pytest
+
+from src.model.pipeline import Pipeline, Stage
+from src.model.process_cluster_data import Model
+from src.model.progress import ProgressReporter
+
+
+def test_only_stages_after_a_changed_parameter_run_again():
+    runs = []
+
+    def stage(name):
+        def run(progress, *inputs, **parameters):
+            runs.append(name)
+            return (name, inputs, parameters)
+
+        return run
+
+    pipeline = Pipeline(
+        [
+            Stage("a", stage("a"), parameters=["x"]),
+            Stage("b", stage("b"), ["a"]),
+            Stage("c", stage("c"), ["b"], ["y"]),
+        ]
+    )
+
+    pipeline.run({"x": 1, "y": 1}, ProgressReporter())
+    pipeline.run({"x": 1, "y": 2}, ProgressReporter())
+    outputs = pipeline.run({"x": 2, "y": 2}, ProgressReporter())
+
+    assert runs == ["a", "b", "c", "c", "a", "b", "c"]
+    assert outputs["a"] == ("a", (), {"x": 2})
+
+
+def test_changing_exposure_rounding_keeps_loaded_data(cluster_path):
+    model = Model(cluster_path)
+    model.start_process()
+    data, summary = model.data, model.summary_data
+
+    model.set_parameters(exposure_decimals=0)
+    model.start_process()
+
+    assert model.data is data
+    assert model.summary_data is not summary
+    assert (model.summary_data["Exposure"] % 1 == 0).all()
+    with pytest.raises(ValueError):
+        model.set_parameters(p_threshold=0.01)
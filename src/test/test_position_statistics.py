@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from src.model.coverage_index import CoverageIndex
+from src.model.position_statistics import combine_statistics
+
+
+def make_protein_group():
+    rng = np.random.default_rng(0)
+    n_rows = 60
+    starts = rng.integers(1, 40, n_rows)
+    return pd.DataFrame(
+        {
+            "Start": starts,
+            "End": starts + rng.integers(4, 20, n_rows),
+            "State": rng.choice(["control", "state_1", "state_2"], n_rows),
+            "Exposure": rng.choice([0.0, 0.5, 30.0], n_rows),
+            "Count": rng.integers(1, 8, n_rows),
+            "Rel. Uptake Mean": rng.random(n_rows),
+            "Rel. Uptake Variance": rng.random(n_rows) / 100,
+        }
+    )
+
+
+def combine_means_variance_count(position_data_per_state):
+    # the per-position pandas calculation combine_statistics replaced; receives
+    # a dataframe with all the peptides of one state
+
+    # calculate combined mean
+    combined_mean = (
+        position_data_per_state["Count"] * position_data_per_state["Rel. Uptake Mean"]
+    ).sum() / position_data_per_state["Count"].sum()
+    # calculate combined variance
+    combined_within = (
+        (position_data_per_state["Count"] - 1)
+        * position_data_per_state["Rel. Uptake Variance"]
+    ).sum()
+    combined_between = (
+        position_data_per_state["Count"]
+        * (position_data_per_state["Rel. Uptake Mean"] - combined_mean) ** 2
+    ).sum()
+    denominator = (position_data_per_state["Count"] - 1).sum() + 1
+    combined_variance = (combined_within + combined_between) / denominator
+    # calulate combined count
+    combined_count = position_data_per_state["Count"].sum()
+    # return df with combined mean, combined variance and count
+
+    return pd.Series(
+        {
+            "Combined Mean": combined_mean,
+            "Combined Variance": combined_variance,
+            "Combined Count": combined_count,
+        }
+    )
+
+
+def combine(protein_group):
+    coverage = CoverageIndex(protein_group["Start"], protein_group["End"])
+    state_codes, states = pd.factorize(protein_group["State"], sort=True)
+    exposure_codes, exposures = pd.factorize(protein_group["Exposure"], sort=True)
+    mean, variance, count = combine_statistics(
+        coverage,
+        state_codes,
+        exposure_codes,
+        protein_group["Count"].to_numpy(dtype=np.float64),
+        protein_group["Rel. Uptake Mean"].to_numpy(dtype=np.float64),
+        protein_group["Rel. Uptake Variance"].to_numpy(dtype=np.float64),
+        len(states),
+        len(exposures),
+    )
+    return coverage, np.asarray(states), np.asarray(exposures), mean, variance, count
+
+
+def test_combined_statistics_match_per_position_calculation():
+    protein_group = make_protein_group()
+    coverage, states, exposures, mean, variance, count = combine(protein_group)
+
+    for i in coverage.positions():
+        covering = protein_group[
+            (protein_group["Start"] < i) & (protein_group["End"] >= i)
+        ]
+        if covering.empty:
+            continue
+        expected = (
+            covering.groupby(["Exposure", "State"])
+            .apply(combine_means_variance_count, include_groups=False)
+            .reset_index()
+        )
+        offset = i - coverage.first_position
+        state_codes, exposure_codes = np.nonzero(count[:, :, offset] > 0)
+        result = pd.DataFrame(
+            {
+                "Exposure": exposures[exposure_codes],
+                "State": states[state_codes],
+                "Combined Mean": mean[state_codes, exposure_codes, offset],
+                "Combined Variance": variance[state_codes, exposure_codes, offset],
+                "Combined Count": count[state_codes, exposure_codes, offset],
+            }
+        ).sort_values(["Exposure", "State"], ignore_index=True)
+
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-12)
+
+
+def test_uncovered_cells_have_zero_count_and_nan_stats():
+    _, _, _, mean, variance, count = combine(make_protein_group())
+
+    uncovered = count == 0
+    assert uncovered[:, :, 0].all()
+    assert np.isnan(mean[uncovered]).all()
+    assert np.isnan(variance[uncovered]).all()
@@ -0,0 +1,30 @@
+import queue
+
+from src.model.progress import ProgressEvent, ProgressReporter, drain
+
+
+def test_counts_are_throttled_but_completion_is_sent():
+    events = queue.Queue()
+    progress = ProgressReporter(events, interval=60)
+
+    progress.start("Processing positions", 100, "positions")
+    for done in range(1, 50):
+        progress.update("Processing positions", done, 100, "positions")
+    assert len(drain(events)) == 1
+
+    progress.update("Processing positions", 100, 100, "positions")
+    (event,) = drain(events)
+    assert event.done == 100
+
+    progress.update("Processing positions", 100, 200, "positions")
+    progress.close()
+    assert [event.total for event in drain(events)] == [200]
+
+
+def test_event_describes_rate_and_eta():
+    event = ProgressEvent("Processing positions", 50, 200, "positions", elapsed=10)
+
+    assert event.rate() == 5
+    assert event.eta() == 30
+    assert event.describe() == "50/200 positions, 5 positions/s, ETA 0:00:30"
+    assert ProgressEvent("Reading cluster file").describe() == ""
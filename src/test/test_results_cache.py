@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from src.model.input_cache import InputCache
+from src.model.process_cluster_data import Model
+from src.model.results_cache import ResultsCache
+
+
+def test_processed_results_are_loaded_from_cache(cluster_path, tmp_path):
+    input_cache = InputCache(tmp_path / "inputs")
+    results_cache = ResultsCache(tmp_path / "results")
+    model = Model(cluster_path, input_cache=input_cache, results_cache=results_cache)
+    assert not model.load_cached_results()
+    model.start_process()
+
+    cached = Model(cluster_path, input_cache=input_cache, results_cache=results_cache)
+    assert cached.load_cached_results()
+
+    pd.testing.assert_frame_equal(cached.summary_data, model.summary_data)
+    expected = model.results["protein_1"]
+    result = cached.results["protein_1"]
+    assert result.states == expected.states
+    assert result.exposures == expected.exposures
+    np.testing.assert_array_equal(result.mean, expected.mean)
+    np.testing.assert_array_equal(result.tukey, expected.tukey)
+    assert cached.get_dataset("protein_1", 30, "control")["min_max"] == (
+        model.get_dataset("protein_1", 30, "control")["min_max"]
+    )
+
+
+def test_changed_parameters_miss_the_cache(cluster_path, tmp_path):
+    results_cache = ResultsCache(tmp_path / "results")
+    Model(cluster_path, results_cache=results_cache).start_process()
+
+    assert Model(cluster_path, results_cache=results_cache).load_cached_results()
+    assert not Model(
+        cluster_path, results_cache=results_cache, exposure_decimals=1
+    ).load_cached_results()
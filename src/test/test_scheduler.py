@@ -0,0 +1,132 @@
+import resource
+
+import numpy as np
+import pandas as pd
+
+from src.model.process_cluster_data import Model
+from src.model.position_processor import PositionJob
+from src.model.scheduler import TaskQueue, schedule
+from src.model.worker_pool import WorkerPool
+
+CSV_PATH = "resources/csv/cluster_g.csv"
+
+
+def protein_group(end):
+    test_df = pd.read_csv(CSV_PATH)
+    test_df = test_df.loc[test_df["End"] < end].reset_index(drop=True)
+    test_df["Rel. Uptake Mean"] = test_df["Center"]
+    test_df["Rel. Uptake Variance"] = 0.1
+    test_df["Count"] = 1.0
+    return test_df
+
+
+def test_large_proteins_are_split_and_small_ones_packed():
+    large = PositionJob("large", protein_group(200))
+    small = [PositionJob(f"small_{i}", protein_group(40)) for i in range(6)]
+
+    tasks = schedule([large] + small, 8)
+
+    large_windows = [w for task in tasks for w in task if w[0] == "large"]
+    assert len(large_windows) > 1
+    covered = sorted((w[-2], w[-1]) for w in large_windows)
+    assert covered[0][0] == large.first_position
+    assert covered[-1][1] == large.last_position
+    for (_, last), (first, _) in zip(covered, covered[1:]):
+        assert first == last + 1
+
+    small_tasks = [task for task in tasks if all(w[0] != "large" for w in task)]
+    assert len(small_tasks) < len(small)
+
+
+def copies_path(tmp_path, n):
+    test_df = pd.read_csv(CSV_PATH)
+    test_df = test_df.loc[test_df["End"] < 40]
+    copies = []
+    for i in range(n):
+        copy = test_df.copy()
+        copy["Protein"] = f"protein_{i}"
+        copies.append(copy)
+    path = tmp_path / "cluster.csv"
+    pd.concat(copies).to_csv(path, index=False)
+    return path
+
+
+def test_task_queue_takes_the_priority_protein_first():
+    tasks = [[("a", 1, 5)], [("c", 1, 5), ("b", 1, 5)], [("b", 6, 9)]]
+    queue = TaskQueue(tasks)
+
+    assert queue.peek("b") == [("c", 1, 5), ("b", 1, 5)]
+    queue.remove(queue.peek("b"))
+    assert queue.peek("d") == [("a", 1, 5)]
+    queue.remove(queue.peek("d"))
+    assert queue.peek() == [("b", 6, 9)]
+    queue.remove(queue.peek())
+    assert not queue
+
+
+def test_windows_of_a_protein_are_kept_together():
+    jobs = [PositionJob(f"protein_{i}", protein_group(200)) for i in range(3)]
+
+    tasks = schedule(jobs, 12, max_windows=2)
+
+    proteins = [window[0] for task in tasks for window in task]
+    assert len(proteins) > 3
+    # each protein's windows form one run
+    runs = [p for i, p in enumerate(proteins) if i == 0 or p != proteins[i - 1]]
+    assert sorted(runs) == sorted(set(proteins))
+    assert all(len(task) <= 2 for task in tasks)
+
+
+def test_proteins_are_published_as_they_complete(tmp_path):
+    model = Model(copies_path(tmp_path, 3))
+    model.prioritise("protein_2")
+    published = []
+
+    def on_protein(protein):
+        # datasets of the published proteins are served during the run
+        assert model.results is None
+        assert model.get_dataset(protein, 30, "control")["data"]["mean"].size
+        published.append(protein)
+
+    model.start_process(on_protein=on_protein)
+
+    assert published == ["protein_2", "protein_0", "protein_1"]
+    assert model.results.protein_list() == ["protein_0", "protein_1", "protein_2"]
+    assert model.partial_results is None
+
+
+def test_proteins_in_one_file_are_processed_together(tmp_path):
+    path = copies_path(tmp_path, 5)
+
+    pool = WorkerPool(workers=2)
+    try:
+        model = Model(path, executor=pool)
+        model.start_process()
+    finally:
+        pool.close()
+
+    expected = model.results["protein_0"]
+    for i in range(1, 5):
+        result = model.results[f"protein_{i}"]
+        np.testing.assert_array_equal(result.mean, expected.mean)
+        np.testing.assert_array_equal(result.tukey, expected.tukey)
+
+
+def test_many_proteins_run_on_workers_within_the_descriptor_limit(tmp_path):
+    # every protein's shared memory at once used to need about 24
+    # descriptors per protein, more than 1024 for these 50
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(1024, hard), hard))
+    pool = WorkerPool(workers=2)
+    try:
+        model = Model(copies_path(tmp_path, 50), executor=pool)
+        model.start_process()
+    finally:
+        pool.close()
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    assert len(model.results.protein_list()) == 50
+    expected = model.results["protein_0"]
+    result = model.results["protein_49"]
+    np.testing.assert_array_equal(result.mean, expected.mean)
+    np.testing.assert_array_equal(result.tukey, expected.tukey)
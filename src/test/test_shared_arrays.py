@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.model.shared_arrays import AttachedArrays, SharedArrays
+
+
+def test_attached_arrays_share_memory_with_their_owner():
+    arrays = SharedArrays()
+    try:
+        arrays.put("values", np.arange(5, dtype=np.int64))
+        arrays.create("output", (2, 3))
+        handles = arrays.handles()
+
+        with AttachedArrays(handles) as attached:
+            np.testing.assert_array_equal(attached["values"], np.arange(5))
+            attached["output"][1] = 7.0
+
+        assert np.isnan(arrays["output"][0]).all()
+        np.testing.assert_array_equal(arrays["output"][1], [7.0, 7.0, 7.0])
+    finally:
+        arrays.close()
+
+
+def test_unshared_handles_are_the_arrays():
+    arrays = SharedArrays(shared=False)
+    values = arrays.put("values", np.arange(3.0))
+
+    with AttachedArrays(arrays.handles()) as attached:
+        assert attached["values"] is values
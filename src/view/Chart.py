@@ -1,16 +1,13 @@
-import math
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import matplotlib.lines as Line2D
-from src.model.process_cluster_data import Model
 import customtkinter as ctk
 import re
 
 
 class ChartWindow:
-    def __init__(self, data, app):
+    def __init__(self, data, app, p_threshold=0.05, fdr=False):
         self.plot_window = ctk.CTkToplevel()
         self.plot_window.title("PAVED plot")
         self.app = app
@@ -18,6 +15,11 @@ class ChartWindow:
         # self.plot_window.config(width=720, height=480)
 
         self.data = None
+        # significance markers are drawn from the stored p-values, so changing
+        # these only redraws the markers
+        self.p_threshold = p_threshold
+        self.fdr = fdr
+        self.marker_lines = []
         self.fig, self.ax = plt.subplots()
         self.chart_y_min = None
         self.chart_y_max = None
@@ -34,54 +36,66 @@ class ChartWindow:
 
         return f"720x480+{x}+{y}"
 
-    def plot_exposures(self, exposure_group):
-        # fig.suptitle(exposure_group.iloc[0]["Exposure"])
-        # for index, row in exposure_group.iterrows():
-        p_threshold = 0.05
-        state = exposure_group.name
-        full_positions = pd.Series(
-            range(1, exposure_group["Position"].max() + 1), name="Position"
-        )
+    def plot_exposures(self, data, state_index):
+        state = data["states"][state_index]
+        positions = data["positions"]
+        mean = data["mean"][state_index]
+        deviation = np.sqrt(data["variance"][state_index])
 
-        exposure_group = pd.merge(
-            full_positions, exposure_group, on="Position", how="left"
-        )
         self.ax.plot(
-            exposure_group["Position"],
-            exposure_group["Combined Mean"],
+            positions,
+            mean,
             linewidth=2,
             label=state,
         )
 
-        def check_significance(row):
-            # try:
-            if row["p_value"] < 0.05:
-                return row["Combined Mean"] + 0.0025
-            # except TypeError:
-            else:
-                return np.NaN
-
-        if "p_value" in exposure_group:
-            exposure_group["is_significant"] = exposure_group.apply(
-                check_significance, axis=1
-            )
+        if "p_value" in data:
+            self.plot_markers(data, state_index)
+        self.ax.fill_between(
+            positions,
+            mean - deviation,
+            mean + deviation,
+            alpha=0.10,
+            linewidth=0.5,
+        )
+
+    def plot_markers(self, data, state_index):
+        # a position is marked when both its ANOVA and the Tukey p-value of
+        # the state against the reference are below the threshold
+        if self.fdr:
+            anova_p = data["adjusted_anova_p"]
+            p_value = data["adjusted_p_value"][state_index]
+        else:
+            anova_p = data["anova_p"]
+            p_value = data["p_value"][state_index]
+        is_significant = np.where(
+            (anova_p < self.p_threshold) & (p_value < self.p_threshold),
+            data["mean"][state_index] + 0.0025,
+            np.nan,
+        )
+        self.marker_lines.extend(
             self.ax.plot(
-                exposure_group["Position"],
-                exposure_group["is_significant"],
+                data["positions"],
+                is_significant,
                 ".k",
                 linewidth=2,
                 markersize=1,
             )
-        self.ax.fill_between(
-            exposure_group["Position"],
-            exposure_group["Combined Mean"]
-            - np.sqrt(exposure_group["Combined Variance"]),
-            exposure_group["Combined Mean"]
-            + np.sqrt(exposure_group["Combined Variance"]),
-            alpha=0.10,
-            linewidth=0.5,
         )
 
+    def set_significance(self, p_threshold, fdr):
+        self.p_threshold = p_threshold
+        self.fdr = fdr
+        if self.data is None or "p_value" not in self.data:
+            return
+        for line in self.marker_lines:
+            line.remove()
+        self.marker_lines = []
+        for state_index in range(len(self.data["states"])):
+            if not np.isnan(self.data["mean"][state_index]).all():
+                self.plot_markers(self.data, state_index)
+        self.canvas.draw_idle()
+
     def remove_plot(self):
         self.plot_window.destroy()
 
@@ -90,8 +104,12 @@ class ChartWindow:
             self.fig.clf()
             self.ax = self.fig.add_subplot(111)
         self.data = data
+        self.marker_lines = []
         self.fig.tight_layout()
-        self.data.groupby("State").apply(self.plot_exposures, include_groups=False)
+        for state_index in range(len(data["states"])):
+            # skip states with no data for this protein and exposure
+            if not np.isnan(data["mean"][state_index]).all():
+                self.plot_exposures(data, state_index)
         if "p_value" in data:
             self.ax.scatter(
                 [], [], color="black", label="Significant difference", marker="."
@@ -137,6 +137,45 @@ class GUI:
         )
         self.rows.increment_row()
 
+        self.significance_label = ctk.CTkLabel(app, text="Significance threshold:")
+        self.significance_label.grid(
+            column=0,
+            row=self.rows.get_row_number(),
+            columnspan=2,
+            pady=(15, 2),
+        )
+        self.p_threshold = 0.05
+        self.significance_var = ctk.StringVar(value=str(self.p_threshold))
+        self.significance_entry = ctk.CTkEntry(
+            app, width=60, textvariable=self.significance_var
+        )
+        self.significance_entry.bind("<Return>", controller.change_significance)
+        self.significance_entry.bind("<FocusOut>", controller.change_significance)
+        self.significance_entry.grid(
+            column=2,
+            row=self.rows.get_row_number(),
+            pady=(15, 2),
+        )
+        self.rows.increment_row()
+
+        self.fdr_var = ctk.IntVar(value=0)
+        self.fdr_checkbox = ctk.CTkCheckBox(
+            app,
+            text="Adjust for false discovery rate",
+            command=self.controller.change_significance,
+            onvalue=1,
+            offvalue=0,
+            variable=self.fdr_var,
+        )
+        self.fdr_checkbox.grid(
+            padx=20,
+            pady=(5, 2),
+            column=0,
+            row=self.rows.get_row_number(),
+            columnspan=3,
+        )
+        self.rows.increment_row()
+
         self.reset_button = ctk.CTkButton(
             app,
             text="Reset",
@@ -178,6 +217,24 @@ class GUI:
         self.protein_dropdown.configure(state=state)
         self.protein_dropdown_var.set(self.proteins[0])
 
+    def select_protein(self, protein):
+        self.protein_dropdown_var.set(protein)
+
+    def update_lists(self, states, exposures):
+        # states and exposures of proteins published since, keeping the
+        # selected ones
+        self.states = states
+        self.state_dropdown.configure(values=states)
+        exposure = self.get_selected_exposure()
+        if 0 in exposures:
+            exposures.remove(0)
+        self.exposures = sorted(exposures)
+        index = self.exposures.index(exposure)
+        self.left.configure(state="normal" if index > 0 else "disabled")
+        self.right.configure(
+            state="normal" if index + 1 < len(self.exposures) else "disabled"
+        )
+
     def new_model(self, states, exposures, proteins):
         self.set_states(states)
         self.set_exposures(exposures)
@@ -188,7 +245,7 @@ class GUI:
         self.path_text.configure(state="disabled")
 
     def create_plot_window(self, data):
-        self.chart = ChartWindow(data, self)
+        self.chart = ChartWindow(data, self, self.p_threshold, self.fdr_var.get())
 
     def model_removed(self):
         self.set_states(["No data"], disable=True)
@@ -241,16 +298,43 @@ class GUI:
             icon="cancel",
         )
 
-    def new_progress_window(self):
-        self.progress_window = ProgressWindow()
+    def processing_error(self, error):
+        # the last line of the engine's traceback names the exception
+        CTkMessagebox(
+            title="Error",
+            message=f"Processing failed: {error.strip().splitlines()[-1]}",
+            icon="cancel",
+        )
 
-    def update_progress(self, process, progress):
-        self.progress_window.progress_update(process, progress)
+    def new_progress_window(self, progress_queue):
+        self.progress_window = ProgressWindow(
+            progress_queue, self.controller.cancel_processing
+        )
+
+    def processing_cancelling(self):
+        self.progress_window.cancelling()
 
     def close_progress_window(self):
         self.progress_window.close_progress_window()
         self.progress_window = None
 
+    def read_significance(self):
+        """Take the threshold from the entry if it is a valid p-value,
+        otherwise put the last valid one back; returns threshold and FDR."""
+        try:
+            p_threshold = float(self.significance_var.get())
+        except ValueError:
+            p_threshold = None
+        if p_threshold is not None and 0 < p_threshold <= 1:
+            self.p_threshold = p_threshold
+        else:
+            self.significance_var.set(str(self.p_threshold))
+        return self.p_threshold, bool(self.fdr_var.get())
+
+    def update_significance(self, p_threshold, fdr):
+        if self.chart != None:
+            self.chart.set_significance(p_threshold, fdr)
+
     def set_chart_min_max(self, min_max):
         if self.chart != None:
             self.chart.set_min_max(min_max)
@@ -1,9 +1,21 @@
 import customtkinter as ctk
+from src.model.progress import drain
 from src.view.row_manager import RowManager
 
+# milliseconds between reads of the progress queue
+POLL_INTERVAL = 200
+
 
 class ProgressWindow:
-    def __init__(self):
+    """Shows the ProgressEvents put on queue while a file is processed.
+
+    The queue is read every POLL_INTERVAL ms from the Tk event loop with
+    after(); all events waiting are coalesced so each stage's label is set
+    once per poll with its latest count, rate and ETA.
+    """
+
+    def __init__(self, queue, cancel_command):
+        self.queue = queue
         self.rows = RowManager()
         self.progress_window = ctk.CTkToplevel()
         self.progress_window.title("Data progressing progress")
@@ -12,8 +24,28 @@ class ProgressWindow:
         self.label_frame = ctk.CTkFrame(self.progress_window)
         self.label_frame.pack(fill="both", expand=True)
 
+        self.cancel_button = ctk.CTkButton(
+            self.progress_window,
+            text="Cancel",
+            width=50,
+            height=20,
+            command=cancel_command,
+        )
+        self.cancel_button.pack(pady=5)
+
         self.progress_processes = {}
-        starting_label = self.add_label("Processing cluster data...")
+        self.progress_processes["Processing cluster data..."] = self.add_label(
+            "Processing cluster data..."
+        )
+        self.poll_id = self.progress_window.after(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        latest = {}
+        for event in drain(self.queue):
+            latest[event.stage] = event
+        for event in latest.values():
+            self.progress_update(event.stage, event.describe())
+        self.poll_id = self.progress_window.after(POLL_INTERVAL, self.poll)
 
     def add_label(self, text):
         label_text = ctk.StringVar(value=text)
@@ -27,26 +59,24 @@ class ProgressWindow:
             padx=5,
             pady=2,
         )
-        self.progress_processes["Processing cluster data..."] = path_label
 
-        self.progress_window.update_idletasks()
-        self.progress_window.update()
-        frame_height = self.label_frame.winfo_height()
-        window_height = self.progress_window.winfo_height()
-        height = len(self.progress_processes.keys()) * 50
-        self.progress_window.geometry(f"{self.progress_window.winfo_width()}x{height}")
+        # a row per label and one for the cancel button
+        height = (len(self.progress_processes) + 2) * 50
+        self.progress_window.geometry(f"500x{height}")
 
         return label_text
 
     def progress_update(self, process, progress):
-
+        text = f"{process}: {progress}" if progress else process
         if process in self.progress_processes:
-            self.update_progress_label(process, progress)
+            self.progress_processes[process].set(text)
         else:
-            self.progress_processes[process] = self.add_label(f"{process}: {progress}")
+            self.progress_processes[process] = self.add_label(text)
 
-    def update_progress_label(self, process, progress):
-        self.progress_processes[process].set(f"{process}: {progress}")
+    def cancelling(self):
+        self.cancel_button.configure(state="disabled")
+        self.progress_update("Cancelling", "stopping workers")
 
     def close_progress_window(self):
+        self.progress_window.after_cancel(self.poll_id)
         self.progress_window.destroy()